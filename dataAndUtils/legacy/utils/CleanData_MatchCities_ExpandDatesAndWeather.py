@@ -11,6 +11,14 @@ cd dataAndUtils/legacy && source venv/bin/activate && python utils/CleanData_Mat
 
 optional tags on the end: `--skip-geocoding --no-json`
 
+The Nominatim fallback is limited to 1 request/second by the public server's usage policy. For a
+full run, point `--nominatim-url` at a self-hosted instance (see REFACTORING_README.md); requests
+to it are not rate limited.
+
+The pickle can also be saved once as parquet (add `--convert-to-parquet`); later runs with the same
+`--input-pickle-zip` read the parquet copy next to the zip instead. Any parquet file can also be passed
+with `--input-parquet`, which only reads the columns the pipeline uses.
+
 DATAFRAME STRUCTURES:
 
 See individual module files for detailed dataframe structure documentation:
@@ -34,7 +42,7 @@ INPUT FORMAT:
         - AVG: Average value across years (temperatures in tenths of degrees C)
 
 OUTPUT FORMAT:
-    CSV/JSON with columns: city, country, state, suburb, lat, long, date, name, 
+    CSV/JSON Lines with columns: city, country, state, suburb, lat, long, date, name, 
                           TMAX, TMIN, TAVG, PRCP (if available)
     Example:
         city,country,state,suburb,lat,long,date,name,TMAX,TMIN,TAVG,PRCP
@@ -48,8 +56,10 @@ OUTPUT FORMAT:
         - PRCP: Precipitation in mm (from tenths)
 
 INTERMEDIATE FILES:
-    - vaycay/city_data/geocoding_checkpoint.csv: Incremental geocoding progress
+    - vaycay/city_data/geocoding_checkpoint_parts/: Incremental geocoding progress (parquet part files)
+    - vaycay/city_data/geocoding_checkpoint.csv: Incremental geocoding progress (--legacy-csv-checkpoint)
     - vaycay/city_data/geocoding_progress.json: Progress metadata
+    - vaycay/city_data/nominatim_cache.sqlite: Raw Nominatim responses (reused across runs)
     - vaycay/city_data/ALL_location_specific_data.csv: Final geocoded locations
     - vaycay/city_data/failed_geocodes.json: Locations that failed geocoding
     - weather_processing.log: Detailed processing log
@@ -87,12 +97,16 @@ Improvements:
 - Data validation and quality checks
 """
 
+import numpy as np
 import pandas as pd
 import time
 import sys
 import argparse
+import gc
+import logging
+import multiprocessing as mp
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 from datetime import datetime
-import json
 
 # Import from our new modules - handle both direct execution and package import
 try:
@@ -108,6 +122,8 @@ try:
     )
     from .data_loader import (
         read_from_pickle_zip,
+        read_from_parquet,
+        convert_pickle_zip_to_parquet,
         read_and_prepare_data,
         get_unique_locations
     )
@@ -116,15 +132,21 @@ try:
         reverse_geocode_locations
     )
     from .data_processor import (
+        categorize_location_columns,
+        get_batch_ranges,
+        locate_coordinates,
         merge_with_original,
         pivot_and_clean_data,
+        sort_locations_for_batching,
         validate_data
     )
     from .batch_manager import (
-        check_batch_exists,
         list_existing_batches,
         save_batch_output,
-        save_final_output
+        save_final_output,
+        save_processing_summary,
+        read_batch_location_range,
+        scan_completed_batches
     )
 except ImportError:
     # Fall back to absolute imports (when run directly as a script)
@@ -139,6 +161,8 @@ except ImportError:
     )
     from data_loader import (
         read_from_pickle_zip,
+        read_from_parquet,
+        convert_pickle_zip_to_parquet,
         read_and_prepare_data,
         get_unique_locations
     )
@@ -147,15 +171,21 @@ except ImportError:
         reverse_geocode_locations
     )
     from data_processor import (
+        categorize_location_columns,
+        get_batch_ranges,
+        locate_coordinates,
         merge_with_original,
         pivot_and_clean_data,
+        sort_locations_for_batching,
         validate_data
     )
     from batch_manager import (
-        check_batch_exists,
         list_existing_batches,
         save_batch_output,
-        save_final_output
+        save_final_output,
+        save_processing_summary,
+        read_batch_location_range,
+        scan_completed_batches
     )
 
 # Settings
@@ -200,6 +230,18 @@ Examples:
         help='Path to input weather data as zipped pickle file (.pkl.zip)'
     )
     
+    parser.add_argument(
+        '--input-parquet',
+        type=str,
+        help='Path to input weather data as parquet file (only the needed columns are read)'
+    )
+    
+    parser.add_argument(
+        '--convert-to-parquet',
+        action='store_true',
+        help='Save --input-pickle-zip as parquet next to the zip (later runs read the parquet copy)'
+    )
+    
     parser.add_argument(
         '--output-dir',
         type=str,
@@ -214,12 +256,24 @@ Examples:
         help='Delay in seconds between geocoding requests'
     )
     
+    parser.add_argument(
+        '--nominatim-url',
+        type=str,
+        help='Base URL of a self-hosted Nominatim (e.g. http://localhost:8080); requests are not rate limited'
+    )
+    
     parser.add_argument(
         '--skip-geocoding',
         action='store_true',
         help='Skip geocoding step and use existing checkpoint data'
     )
     
+    parser.add_argument(
+        '--legacy-csv-checkpoint',
+        action='store_true',
+        help='Keep the geocoding checkpoint in one CSV (rewritten every batch) instead of parquet part files'
+    )
+    
     parser.add_argument(
         '--resume-only',
         action='store_true',
@@ -235,7 +289,28 @@ Examples:
     parser.add_argument(
         '--no-json',
         action='store_true',
-        help='Skip JSON output (only save CSV)'
+        help='Skip JSON Lines output (only save CSV)'
+    )
+    
+    parser.add_argument(
+        '--output-format',
+        choices=['csv', 'parquet'],
+        default='csv',
+        help='Batch output file format (default: csv; parquet skips JSON output)'
+    )
+    
+    parser.add_argument(
+        '--compression',
+        choices=['zstd', 'snappy'],
+        default='zstd',
+        help='Parquet compression codec (default: zstd; only used with --output-format parquet)'
+    )
+    
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=1,
+        help='Number of worker processes for batch processing (default: 1, no pool)'
     )
     
     parser.add_argument(
@@ -261,6 +336,110 @@ Examples:
     return parser.parse_args()
 
 
+# frames the batches are sliced from: location columns and location-sorted weather rows
+# (set in main before any worker starts, so forked workers inherit them copy-on-write)
+_SHARED_BATCH_FRAMES = {}
+
+
+def slice_batch(location_range, row_range):
+    """
+    Slice one batch out of the shared frames (read-only views - nothing mutates them).
+
+    Args:
+        location_range: tuple of (start, end) location indices (1-based, inclusive)
+        row_range: tuple of (start, end) weather row positions (end exclusive)
+
+    Returns:
+        tuple of (batch_locations, df_weather_batch)
+    """
+    batch_locations = _SHARED_BATCH_FRAMES['locations'].iloc[location_range[0] - 1:location_range[1]]
+    df_weather_batch = _SHARED_BATCH_FRAMES['weather'].iloc[row_range[0]:row_range[1]]
+    return batch_locations, df_weather_batch
+
+
+def process_batch_range(batch_num, location_range, row_range, save_json=True,
+                        output_format='csv', compression='zstd', validate=False):
+    """process_batch for a batch given by its location and weather row ranges (see slice_batch)."""
+    return process_batch(batch_num, location_range, *slice_batch(location_range, row_range),
+                         save_json=save_json, output_format=output_format,
+                         compression=compression, validate=validate)
+
+
+def process_batch(batch_num, location_range, batch_locations, df_weather_batch,
+                  save_json=True, output_format='csv', compression='zstd', validate=False):
+    """
+    Enrich, pivot and save one batch of locations.
+
+    Top-level (picklable) so it can run in a worker process.
+
+    Args:
+        batch_num: batch number
+        location_range: tuple of (start, end) location indices (1-based, for metadata)
+        batch_locations: location columns for the locations in this batch, in location_id
+            order (row i is location location_range[0] - 1 + i)
+        df_weather_batch: weather records for the locations in this batch
+        save_json: whether to also save JSON Lines
+        output_format: batch file format ('csv' or 'parquet')
+        compression: parquet compression codec ('zstd' or 'snappy')
+        validate: run data validation checks on the cleaned batch
+
+    Returns:
+        number of records saved
+    """
+    # enrich with location data: every weather row carries its location's position
+    # (location_id), so the location columns are gathered by position - no hash join
+    location_positions = df_weather_batch['location_id'].to_numpy() - (location_range[0] - 1)
+    df_batch_enriched = pd.concat(
+        [df_weather_batch.reset_index(drop=True),
+         batch_locations.take(location_positions).reset_index(drop=True)],
+        axis=1
+    )
+    
+    # pivot and clean
+    logger.info("  Pivoting and cleaning batch %d...", batch_num)
+    df_batch_cleaned = pivot_and_clean_data(df_batch_enriched)
+    
+    # validate if requested
+    if validate:
+        validate_data(df_batch_cleaned)
+    
+    # save batch
+    save_batch_output(
+        df_batch_cleaned, 
+        batch_num, 
+        location_range,
+        save_json=save_json,
+        output_format=output_format,
+        compression=compression
+    )
+    
+    return len(df_batch_cleaned)
+
+
+def prepare_geocoded_locations(geocoded_data: pd.DataFrame) -> pd.DataFrame:
+    """
+    Prepare geocoded locations (from the checkpoint or a geocoding run) for batching.
+
+    Args:
+        geocoded_data: geocoded locations, one row per station coordinate
+
+    Returns:
+        the locations with categorical location columns, sorted for batching
+    """
+    # No filtering needed - all locations are now successfully geocoded
+    logger.info(f"Loaded {len(geocoded_data):,} geocoded locations (100% coverage)")
+
+    # store repetitive location strings as categoricals (sorting below then runs on codes)
+    geocoded_data = categorize_location_columns(geocoded_data)
+
+    # SORTING FIX: Sort by city to keep same-city stations together in batches
+    # (cities are ordered by geohash so neighbouring cities land in neighbouring batches)
+    logger.info("Sorting locations by city to keep same-city stations together...")
+    geocoded_data = sort_locations_for_batching(geocoded_data)
+    logger.info("✓ Locations sorted - same-city stations will be in same batch")
+    return geocoded_data
+
+
 def main():
     """Main execution function."""
     args = parse_arguments()
@@ -281,9 +460,16 @@ def main():
     logger.info(f"  Batch output directory: {BATCH_OUTPUT_DIR}")
     logger.info(f"  Output batch size (locations): {args.batch_size_locations}")
     logger.info(f"  Geocoding delay: {args.geocoding_delay}s")
+    if args.nominatim_url:
+        logger.info(f"  Nominatim URL: {args.nominatim_url}")
     logger.info(f"  Skip geocoding: {args.skip_geocoding}")
+    logger.info(f"  Legacy CSV checkpoint: {args.legacy_csv_checkpoint}")
     logger.info(f"  Resume only: {args.resume_only}")
     logger.info(f"  Save JSON: {not args.no_json}")
+    logger.info(f"  Output format: {args.output_format}")
+    if args.output_format == 'parquet':
+        logger.info(f"  Compression: {args.compression}")
+    logger.info(f"  Workers: {args.workers}")
     if args.force_reprocess_batch:
         logger.info(f"  Force reprocess batches: {args.force_reprocess_batch}")
     logger.info("")
@@ -295,9 +481,15 @@ def main():
         ensure_directories()
         
         # step 1: read and prepare weather data
-        if args.input_pickle_zip:
+        if args.input_parquet:
+            logger.info(f"  Input parquet: {args.input_parquet}")
+            df_weather = read_from_parquet(args.input_parquet)
+        elif args.input_pickle_zip:
             logger.info(f"  Input pickle zip: {args.input_pickle_zip}")
-            df_weather = read_from_pickle_zip(args.input_pickle_zip)
+            if args.convert_to_parquet:
+                df_weather = convert_pickle_zip_to_parquet(args.input_pickle_zip)
+            else:
+                df_weather = read_from_pickle_zip(args.input_pickle_zip)
         else:
             df_weather = read_and_prepare_data(args.input_csv)
         
@@ -308,43 +500,24 @@ def main():
         # step 3: reverse geocode locations (with checkpoint support)
         if args.skip_geocoding:
             logger.info("Skipping geocoding, loading from checkpoint...")
-            geocoded_data = load_geocoding_progress()
+            geocoded_data = load_geocoding_progress(args.legacy_csv_checkpoint, unique_locs)
             if geocoded_data is None:
                 raise ValueError("No geocoding checkpoint found. Run without --skip-geocoding first.")
-
-            # No filtering needed - all locations are now successfully geocoded
-            logger.info(f"Loaded {len(geocoded_data):,} geocoded locations (100% coverage)")
-
-            # SORTING FIX: Sort by city to keep same-city stations together in batches
-            logger.info("Sorting locations by city to keep same-city stations together...")
-            geocoded_data = geocoded_data.sort_values(
-                ['city', 'country', 'state', 'lat', 'long']
-            ).reset_index(drop=True)
-            logger.info("✓ Locations sorted - same-city stations will be in same batch")
-
-            total_locations = len(geocoded_data)
         else:
             # geocoding step - runs worldcities matching + nominatim fallback
             geocoded_data = reverse_geocode_locations(
                 unique_locs,
-                geocoding_delay=args.geocoding_delay
+                geocoding_delay=args.geocoding_delay,
+                legacy_csv_checkpoint=args.legacy_csv_checkpoint,
+                nominatim_url=args.nominatim_url
             )
 
-            # No filtering needed - all locations are now successfully geocoded
-            logger.info(f"Loaded {len(geocoded_data):,} geocoded locations (100% coverage)")
-
-            # SORTING FIX: Sort by city to keep same-city stations together in batches
-            logger.info("Sorting locations by city to keep same-city stations together...")
-            geocoded_data = geocoded_data.sort_values(
-                ['city', 'country', 'state', 'lat', 'long']
-            ).reset_index(drop=True)
-            logger.info("✓ Locations sorted - same-city stations will be in same batch")
-
-            total_locations = len(geocoded_data)
-
             if args.resume_only:
                 logger.info("resume-only mode: geocoding complete, exiting.")
                 return
+
+        geocoded_data = prepare_geocoded_locations(geocoded_data)
+        total_locations = len(geocoded_data)
         
         # step 4: filter weather data to only include valid geocoded locations
         logger.info("\\nFiltering weather data to only include valid geocoded locations...")
@@ -354,29 +527,72 @@ def main():
         df_weather['lat'] = df_weather['lat'].round(4)
         df_weather['long'] = df_weather['long'].round(4)
         
-        # create set of valid coordinates for fast lookup
-        valid_coords = set(zip(geocoded_data['lat'], geocoded_data['long']))
-        logger.info(f"Valid geocoded coordinates: {len(valid_coords):,}")
-        
-        # filter weather data
-        df_weather['coord_tuple'] = list(zip(df_weather['lat'], df_weather['long']))
-        df_weather = df_weather[df_weather['coord_tuple'].isin(valid_coords)].copy()
-        df_weather = df_weather.drop(columns=['coord_tuple'])
-        
+        logger.info(f"Valid geocoded locations: {len(geocoded_data):,}")
+
+        # tag every weather row with its (sorted) position in geocoded_data, then drop
+        # unmatched rows. this filters the weather data AND lets batches be sliced out
+        # later without rescanning df_weather
+        location_ids = locate_coordinates(df_weather, geocoded_data)
+
+        # locations without a city (e.g. failed lookups in an older checkpoint) would only
+        # produce blank-city rows - count them as unmatched so their weather rows are
+        # dropped here, before the partitioning and the per-batch merges/pivots
+        ungeocoded = geocoded_data['city'].isna().to_numpy()
+        if ungeocoded.any():
+            logger.warning(f"{int(ungeocoded.sum()):,} geocoded locations have no city - dropping their weather records")
+            location_ids[(location_ids >= 0) & ungeocoded[location_ids]] = -1
+        df_weather['location_id'] = location_ids
+
+        # snap rows onto their matched location's coordinates so every row of a location
+        # carries the same lat/long even when the stored coordinates drifted slightly
+        # (unmatched rows pick up junk coordinates here but are dropped right after)
+        df_weather['lat'] = geocoded_data['lat'].to_numpy()[location_ids]
+        df_weather['long'] = geocoded_data['long'].to_numpy()[location_ids]
+
+        # drop unmatched rows and sort the rest by location in one take (stable, so rows
+        # keep their order within a location). a batch is a contiguous range of locations,
+        # so its weather rows are then one slice - no per-batch scan of df_weather (O(batches x N))
+        matched_mask = location_ids >= 0
+        if matched_mask.all():
+            logger.info("All weather records matched a geocoded location (100% station coverage)")
+            row_order = np.argsort(location_ids, kind='stable')
+        else:
+            matched_rows = np.flatnonzero(matched_mask)
+            row_order = matched_rows[np.argsort(location_ids[matched_rows], kind='stable')]
+        df_weather = df_weather.take(row_order)
+        weather_location_ids = df_weather['location_id'].to_numpy()
+
         filtered_weather_count = len(df_weather)
         logger.info(f"Weather data before filtering: {original_weather_count:,} records")
         logger.info(f"Weather data after filtering: {filtered_weather_count:,} records")
         logger.info(f"Filtered out: {original_weather_count - filtered_weather_count:,} records ({100*(original_weather_count - filtered_weather_count)/original_weather_count:.1f}%)")
+
+        # release the per-row arrays of the unsorted frame before batch processing
+        del location_ids, matched_mask, row_order
+        gc.collect()
         
         # step 5: process data in batches
         logger.info("\\n" + "=" * 80)
         logger.info("BATCH PROCESSING")
         logger.info("=" * 80)
         
+        # merge with location data - include all available fields
+        location_cols = ['lat', 'long', 'city', 'state', 'country', 'suburb', 
+                       'city_ascii', 'iso2', 'iso3', 'capital', 'population', 
+                       'worldcities_id', 'data_source']
+        # only include columns that exist in geocoded_data (same for every batch, so select
+        # them once). rows are matched by position (location_id) - weather lat/long were
+        # snapped onto the locations, so the location lat/long columns aren't needed
+        merge_cols = [col for col in location_cols
+                      if col in geocoded_data.columns and col not in ('lat', 'long')]
+        location_merge_data = geocoded_data[merge_cols]
+        
         batch_size_locs = args.batch_size_locations
-        num_batches = (total_locations + batch_size_locs - 1) // batch_size_locs
+        # batches end on city boundaries, so sizes vary around batch_size_locs
+        batch_ranges = get_batch_ranges(geocoded_data, batch_size_locs)
+        num_batches = len(batch_ranges)
         logger.info(f"Total locations: {total_locations:,}")
-        logger.info(f"Batch size: {batch_size_locs} locations")
+        logger.info(f"Batch size: up to {batch_size_locs} locations (cities are never split)")
         logger.info(f"Number of batches: {num_batches}")
         logger.info("")
         
@@ -384,73 +600,128 @@ def main():
         batches_skipped = 0
         total_records_processed = 0
         
-        for batch_idx in range(num_batches):
-            batch_num = batch_idx + 1
-            start_idx = batch_idx * batch_size_locs
-            end_idx = min(start_idx + batch_size_locs, total_locations)
-            
-            # check if we should force reprocess this batch
-            force_reprocess = args.force_reprocess_batch and batch_num in args.force_reprocess_batch
-            
-            # check if batch already exists
-            if not force_reprocess and check_batch_exists(batch_num):
-                logger.info(f"Batch {batch_num}/{num_batches}: Already exists, skipping (locations {start_idx + 1}-{end_idx})")
-                batches_skipped += 1
-                continue
-            
-            logger.info(f"\\n{'=' * 60}")
-            logger.info(f"Processing Batch {batch_num}/{num_batches}")
-            logger.info(f"Locations: {start_idx + 1}-{end_idx} of {total_locations}")
-            logger.info(f"{'=' * 60}")
-            
-            # get locations for this batch
-            batch_locations = geocoded_data.iloc[start_idx:end_idx].copy()
-            
-            # merge with weather data for these locations only
-            logger.info(f"Merging weather data for batch {batch_num}...")
-            
-            # filter weather data to only include locations in this batch
-            # use merge instead of inefficient list comprehension
-            batch_coords_df = batch_locations[['lat', 'long']].copy()
-            df_weather_filtered = df_weather.merge(
-                batch_coords_df,
-                on=['lat', 'long'],
-                how='inner'
-            )
-            
-            logger.info(f"  Weather records for this batch: {len(df_weather_filtered):,}")
-            
-            if len(df_weather_filtered) == 0:
-                logger.warning(f"  No weather data found for batch {batch_num}, skipping")
-                continue
-            
-            # merge with location data - include all available fields
-            location_cols = ['lat', 'long', 'city', 'state', 'country', 'suburb', 
-                           'city_ascii', 'iso2', 'iso3', 'capital', 'population', 
-                           'worldcities_id', 'data_source']
-            # only include columns that exist in batch_locations
-            available_cols = [col for col in location_cols if col in batch_locations.columns]
-            merge_data = batch_locations[available_cols].copy()
-            df_batch_enriched = pd.merge(df_weather_filtered, merge_data, on=['lat', 'long'], how='left')
-            
-            # pivot and clean
-            logger.info(f"  Pivoting and cleaning batch {batch_num}...")
-            df_batch_cleaned = pivot_and_clean_data(df_batch_enriched)
-            
-            # validate if requested
-            if args.validate:
-                validate_data(df_batch_cleaned)
-            
-            # save batch
-            save_batch_output(
-                df_batch_cleaned, 
-                batch_num, 
-                (start_idx + 1, end_idx),
-                save_json=not args.no_json
-            )
+        # list the already completed batches once instead of checking files per batch
+        completed_batches = scan_completed_batches(args.output_format)
+        if completed_batches:
+            logger.info(f"Found {len(completed_batches):,} completed batches on disk")
+            stale_batches = sorted(b for b in completed_batches if b > num_batches)
+            if stale_batches:
+                logger.warning(f"Batches {stale_batches} on disk are beyond the {num_batches} planned "
+                               f"batches (left by a run with other settings) - remove them before importing")
+        
+        def iter_batch_tasks():
+            """Yield process_batch arguments for every batch that needs processing."""
+            nonlocal batches_skipped
             
+            for batch_idx, (start_idx, end_idx) in enumerate(batch_ranges):
+                batch_num = batch_idx + 1
+                
+                # check if we should force reprocess this batch
+                force_reprocess = args.force_reprocess_batch and batch_num in args.force_reprocess_batch
+                
+                # check if batch already exists - and holds the planned locations: batches
+                # from a run with another batch size or location order are reprocessed
+                if not force_reprocess and batch_num in completed_batches:
+                    saved_range = read_batch_location_range(batch_num)
+                    if saved_range == (start_idx + 1, end_idx):
+                        logger.info("Batch %d/%d: Already exists, skipping (locations %d-%d)",
+                                    batch_num, num_batches, start_idx + 1, end_idx)
+                        batches_skipped += 1
+                        continue
+                    logger.warning("Batch %d/%d: Exists with locations %s instead of %d-%d, reprocessing",
+                                   batch_num, num_batches,
+                                   '%d-%d' % saved_range if saved_range else 'unknown',
+                                   start_idx + 1, end_idx)
+                
+                # hot loop: lazy %-style logging, so nothing is formatted when INFO is off
+                logger.info("\\n%s", '=' * 60)
+                logger.info("Processing Batch %d/%d", batch_num, num_batches)
+                logger.info("Locations: %d-%d of %d", start_idx + 1, end_idx, total_locations)
+                logger.info("%s", '=' * 60)
+                
+                # merge with weather data for these locations only
+                logger.info("Merging weather data for batch %d...", batch_num)
+                
+                # weather rows are sorted by location - the batch's rows are one slice
+                row_start, row_end = np.searchsorted(weather_location_ids, (start_idx, end_idx))
+
+                if row_start == row_end:
+                    logger.warning("  No weather data found for batch %d, skipping", batch_num)
+                    continue
+
+                if logger.isEnabledFor(logging.INFO):
+                    logger.info(f"  Weather records for this batch: {row_end - row_start:,}")
+                
+                yield (
+                    batch_num,
+                    (start_idx + 1, end_idx),
+                    (int(row_start), int(row_end)),
+                    not args.no_json,
+                    args.output_format,
+                    args.compression,
+                    args.validate
+                )
+        
+        batch_start_time = time.time()
+        last_completed_batch = None
+        
+        def write_summary():
+            """Write the processing summary (after every batch, so a crash keeps progress)."""
+            wall_time_s = time.time() - batch_start_time
+            summary = {
+                'total_batches': num_batches,
+                'batches_processed': batches_processed,
+                'batches_skipped': batches_skipped,
+                'total_records_processed': total_records_processed,
+                'batch_size_locations': batch_size_locs,
+                'last_completed_batch': last_completed_batch,
+                'wall_time_s': round(wall_time_s, 1),
+                'records_per_s': round(total_records_processed / wall_time_s, 1) if wall_time_s > 0 else None,
+                'processing_timestamp': datetime.now().isoformat()
+            }
+            return save_processing_summary(summary)
+        
+        def record_batch(batch_num, record_count):
+            """Update the counters for a finished batch and refresh the summary."""
+            nonlocal batches_processed, total_records_processed, last_completed_batch
             batches_processed += 1
-            total_records_processed += len(df_batch_cleaned)
+            total_records_processed += record_count
+            last_completed_batch = batch_num
+            write_summary()
+        
+        # batches slice their rows out of these frames (in forked workers too)
+        _SHARED_BATCH_FRAMES['locations'] = location_merge_data
+        _SHARED_BATCH_FRAMES['weather'] = df_weather
+        
+        if args.workers > 1:
+            # batches are independent (disjoint locations, separate output files), so fan
+            # them out to worker processes. forked workers inherit the frames copy-on-write
+            # and only get the batch's row ranges; without fork, the slices are pickled -
+            # then only a few batches are kept in flight so they don't all sit in memory
+            use_fork = 'fork' in mp.get_all_start_methods() and sys.platform != 'darwin'
+            logger.info(f"Processing batches with {args.workers} worker processes "
+                        f"({'fork, shared frames' if use_fork else 'pickled batch slices'})...")
+            max_in_flight = 2 * args.workers
+            mp_context = mp.get_context('fork') if use_fork else None
+            with ProcessPoolExecutor(max_workers=args.workers, mp_context=mp_context) as executor:
+                pending = {}
+                for task in iter_batch_tasks():
+                    if len(pending) >= max_in_flight:
+                        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            record_batch(pending.pop(future), future.result())
+                    if use_fork:
+                        future = executor.submit(process_batch_range, *task)
+                    else:
+                        batch_num, location_range, row_range, *options = task
+                        future = executor.submit(process_batch, batch_num, location_range,
+                                                 *slice_batch(location_range, row_range), *options)
+                    pending[future] = task[0]
+                for future, batch_num in pending.items():
+                    record_batch(batch_num, future.result())
+        else:
+            for task in iter_batch_tasks():
+                record_batch(task[0], process_batch_range(*task))
         
         # create summary
         logger.info("\\n" + "=" * 80)
@@ -462,18 +733,7 @@ def main():
         logger.info(f"Total records processed: {total_records_processed:,}")
         
         # save overall summary
-        summary = {
-            'total_batches': num_batches,
-            'batches_processed': batches_processed,
-            'batches_skipped': batches_skipped,
-            'total_records_processed': total_records_processed,
-            'batch_size_locations': batch_size_locs,
-            'processing_timestamp': datetime.now().isoformat()
-        }
-        
-        summary_path = BATCH_OUTPUT_DIR / 'processing_summary.json'
-        with open(summary_path, 'w') as f:
-            json.dump(summary, f, indent=2)
+        summary_path = write_summary()
         logger.info(f"\\nSaved processing summary to: {summary_path}")
         
         # success!
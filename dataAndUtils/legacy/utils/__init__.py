@@ -33,6 +33,8 @@ from .config import (
 
 from .data_loader import (
     read_from_pickle_zip,
+    read_from_parquet,
+    convert_pickle_zip_to_parquet,
     read_and_prepare_data,
     get_unique_locations
 )
@@ -44,8 +46,13 @@ from .geocoding import (
 )
 
 from .data_processor import (
+    categorize_location_columns,
+    coordinate_keys,
+    get_batch_ranges,
+    locate_coordinates,
     merge_with_original,
     pivot_and_clean_data,
+    sort_locations_for_batching,
     validate_data
 )
 
@@ -53,7 +60,11 @@ from .batch_manager import (
     check_batch_exists,
     list_existing_batches,
     save_batch_output,
-    save_final_output
+    save_final_output,
+    save_processing_summary,
+    read_batch_location_range,
+    scan_completed_batches,
+    summarize_output
 )
 
 __all__ = [
@@ -68,6 +79,8 @@ __all__ = [
     'WORLDCITIES_PATH',
     # Data Loader
     'read_from_pickle_zip',
+    'read_from_parquet',
+    'convert_pickle_zip_to_parquet',
     'read_and_prepare_data',
     'get_unique_locations',
     # Geocoding
@@ -75,12 +88,21 @@ __all__ = [
     'reverse_geocode_locations',
     'load_worldcities',
     # Data Processor
+    'categorize_location_columns',
+    'coordinate_keys',
+    'get_batch_ranges',
+    'locate_coordinates',
     'merge_with_original',
     'pivot_and_clean_data',
+    'sort_locations_for_batching',
     'validate_data',
     # Batch Manager
     'check_batch_exists',
     'list_existing_batches',
     'save_batch_output',
     'save_final_output',
+    'save_processing_summary',
+    'read_batch_location_range',
+    'scan_completed_batches',
+    'summarize_output',
 ]
@@ -4,7 +4,7 @@ Batch management module for weather data processing.
 This module handles:
 1. Checking for existing batches
 2. Saving batch outputs
-3. Managing batch metadata
+3. Managing batch metadata and the processing summary
 4. Listing batch status
 
 INTERMEDIATE FILES:
@@ -16,8 +16,13 @@ INTERMEDIATE FILES:
 """
 
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
 import json
+import os
 from pathlib import Path
+from typing import Optional, Tuple
 from datetime import datetime
 
 # Handle both direct execution and package import
@@ -27,17 +32,89 @@ except ImportError:
     from config import logger, OUTPUT_DIR, BATCH_OUTPUT_DIR
 
 
-def check_batch_exists(batch_num: int) -> bool:
+# Supported batch output formats (file extension per format)
+OUTPUT_FORMATS = {
+    'csv': 'csv',
+    'parquet': 'parquet',
+}
+
+# Supported parquet codecs: zstd (smaller files) or snappy (faster to write and read)
+PARQUET_COMPRESSIONS = ('zstd', 'snappy')
+
+
+def write_csv(df: pd.DataFrame, path: Path):
+    """
+    Write a dataframe to CSV with pyarrow's vectorized (C++) writer.
+
+    Same columns and values as df.to_csv(path, index=False) - NaN/None are written as
+    empty fields and floats use the same shortest round-trip repr. The header and fields
+    are unquoted like pandas writes them; only if some string value contains a comma,
+    quote or newline are all string fields quoted. Integral floats are written without
+    the trailing '.0' (1500000 instead of 1500000.0).
+    """
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    try:
+        pa_csv.write_csv(table, path, pa_csv.WriteOptions(quoting_style='none', quoting_header='none'))
+    except pa.ArrowInvalid:
+        # a value needs quoting - pyarrow can't quote only those, so quote every string
+        pa_csv.write_csv(table, path, pa_csv.WriteOptions(quoting_header='none'))
+
+
+def summarize_output(df: pd.DataFrame) -> dict:
+    """
+    Summary statistics of a cleaned weather frame, computed with one df.agg call.
+
+    Returns:
+        dict with total_records, unique_cities, unique_countries, date_range and - if the
+        frame has a TAVG column - temperature_range (plain python values, JSON serializable)
+    """
+    agg_spec = {'city': 'nunique', 'country': 'nunique', 'date': ['min', 'max']}
+    if 'TAVG' in df.columns:
+        agg_spec['TAVG'] = ['min', 'max']
+    stats = df.agg(agg_spec)
+    
+    summary = {
+        'total_records': int(len(df)),
+        'unique_cities': int(stats.loc['nunique', 'city']),
+        'unique_countries': int(stats.loc['nunique', 'country']),
+        'date_range': {
+            'min': stats.loc['min', 'date'],
+            'max': stats.loc['max', 'date']
+        }
+    }
+    if 'TAVG' in df.columns:
+        summary['temperature_range'] = {
+            'min': float(stats.loc['min', 'TAVG']),
+            'max': float(stats.loc['max', 'TAVG'])
+        }
+    return summary
+
+
+def get_batch_data_path(batch_num: int, output_format: str = 'csv') -> Path:
+    """Get the path to a batch's weather data file for the given output format."""
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unsupported output format: {output_format}")
+    batch_dir = BATCH_OUTPUT_DIR / f'batch{batch_num}'
+    return batch_dir / f'batch{batch_num}_weather_data.{OUTPUT_FORMATS[output_format]}'
+
+
+def check_batch_exists(batch_num: int, output_format: str = 'csv') -> bool:
     """Check if a batch has already been processed."""
     batch_dir = BATCH_OUTPUT_DIR / f'batch{batch_num}'
-    csv_path = batch_dir / f'batch{batch_num}_weather_data.csv'
+    data_path = get_batch_data_path(batch_num, output_format)
     metadata_path = batch_dir / f'batch{batch_num}_metadata.json'
     
-    if csv_path.exists() and metadata_path.exists():
-        # verify the csv has data
+    if data_path.exists() and metadata_path.exists():
+        # verify the data file has data
         try:
-            df_check = pd.read_csv(csv_path, nrows=1)
-            if len(df_check) > 0:
+            if output_format == 'parquet':
+                has_rows = pq.ParquetFile(data_path).metadata.num_rows > 0
+            else:
+                # a data line after the header - no need to start the csv parser for that
+                with open(data_path, 'rb') as f:
+                    f.readline()
+                    has_rows = bool(f.readline().strip())
+            if has_rows:
                 return True
         except Exception as e:
             logger.warning(f"Batch {batch_num} files exist but appear corrupted: {e}")
@@ -45,6 +122,53 @@ def check_batch_exists(batch_num: int) -> bool:
     return False
 
 
+def scan_completed_batches(output_format: str = 'csv') -> set:
+    """
+    Get the numbers of all completed batches with a single directory scan.
+
+    A batch counts as complete when both its data file and its metadata file exist
+    (save_batch_output writes the metadata last). Uses os.scandir, so the names come from
+    the directory listings without a stat per file. Use this instead of calling
+    check_batch_exists once per batch, which stats and opens files for every batch.
+    """
+    if not BATCH_OUTPUT_DIR.exists():
+        return set()
+    
+    completed = set()
+    with os.scandir(BATCH_OUTPUT_DIR) as batch_dirs:
+        for batch_dir in batch_dirs:
+            batch_id = batch_dir.name[len('batch'):]
+            if not (batch_dir.name.startswith('batch') and batch_id.isdigit() and batch_dir.is_dir()):
+                continue
+            # the directory entries already hold the names - no stat per file
+            with os.scandir(batch_dir.path) as entries:
+                names = {entry.name for entry in entries}
+            if (f'{batch_dir.name}_weather_data.{OUTPUT_FORMATS[output_format]}' in names
+                    and f'{batch_dir.name}_metadata.json' in names):
+                completed.add(int(batch_id))
+    
+    return completed
+
+
+def read_batch_location_range(batch_num: int) -> Optional[Tuple[int, int]]:
+    """
+    Get the (start, end) location range a batch was saved with, from its metadata.
+
+    Batch numbers alone don't say which locations a batch holds - that depends on the
+    batch size and location order of the run that wrote it.
+
+    Returns:
+        (start, end) 1-based location range, or None if the metadata is missing or unreadable
+    """
+    metadata_path = BATCH_OUTPUT_DIR / f'batch{batch_num}' / f'batch{batch_num}_metadata.json'
+    try:
+        with open(metadata_path, 'r') as f:
+            location_range = json.load(f)['location_range']
+        return int(location_range['start']), int(location_range['end'])
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
 def list_existing_batches():
     """List all existing batches and their status."""
     logger.info("\\n=== Existing Batches ===")
@@ -53,29 +177,55 @@ def list_existing_batches():
         logger.info("No batch directory found.")
         return
     
-    batch_dirs = sorted([d for d in BATCH_OUTPUT_DIR.iterdir() if d.is_dir() and d.name.startswith('batch')])
+    # DirEntry.is_dir() uses the type from the directory listing (no stat per entry);
+    # sorted numerically so batch10 comes after batch9
+    with os.scandir(BATCH_OUTPUT_DIR) as entries:
+        batch_nums = sorted(
+            int(entry.name[len('batch'):]) for entry in entries
+            if entry.name.startswith('batch') and entry.name[len('batch'):].isdigit()
+            and entry.is_dir(follow_symlinks=False)
+        )
     
-    if not batch_dirs:
+    if not batch_nums:
         logger.info("No batches found.")
         return
     
     total_records = 0
-    for batch_dir in batch_dirs:
-        batch_num = int(batch_dir.name.replace('batch', ''))
-        csv_path = batch_dir / f'batch{batch_num}_weather_data.csv'
+    for batch_num in batch_nums:
+        batch_dir = BATCH_OUTPUT_DIR / f'batch{batch_num}'
+        parquet_path = get_batch_data_path(batch_num, 'parquet')
+        csv_path = get_batch_data_path(batch_num, 'csv')
         metadata_path = batch_dir / f'batch{batch_num}_metadata.json'
         
-        if csv_path.exists():
+        if parquet_path.exists():
+            data_path = parquet_path
+        elif csv_path.exists():
+            data_path = csv_path
+        else:
+            data_path = None
+        
+        if data_path is not None:
             try:
-                df = pd.read_csv(csv_path)
-                record_count = len(df)
-                total_records += record_count
-                
-                status = "✓ Complete"
+                metadata = {}
                 if metadata_path.exists():
                     with open(metadata_path, 'r') as f:
                         metadata = json.load(f)
-                        date_range = f"{metadata.get('date_range', {}).get('min', 'N/A')} to {metadata.get('date_range', {}).get('max', 'N/A')}"
+                
+                if 'total_records' in metadata:
+                    # counted by save_batch_output - the data file isn't opened at all
+                    record_count = metadata['total_records']
+                elif data_path == parquet_path:
+                    # row count from the parquet footer - no column is decoded
+                    record_count = pq.ParquetFile(data_path).metadata.num_rows
+                else:
+                    # count lines (minus the header) instead of parsing the csv
+                    with open(data_path, 'rb') as f:
+                        record_count = sum(1 for _ in f) - 1
+                total_records += record_count
+                
+                status = "✓ Complete"
+                if metadata:
+                    date_range = f"{metadata.get('date_range', {}).get('min', 'N/A')} to {metadata.get('date_range', {}).get('max', 'N/A')}"
                 else:
                     date_range = "N/A"
                 
@@ -88,46 +238,59 @@ def list_existing_batches():
     logger.info(f"\\nTotal records across all batches: {total_records:,}")
 
 
-def save_batch_output(df: pd.DataFrame, batch_num: int, location_range: tuple, save_json: bool = False):
-    """Save a batch of processed data to its own directory."""
+def save_batch_output(df: pd.DataFrame, batch_num: int, location_range: tuple, save_json: bool = False,
+                      output_format: str = 'csv', compression: str = 'zstd'):
+    """
+    Save a batch of processed data to its own directory.
+
+    output_format 'csv' (default) writes the CSV consumed by the database import,
+    optionally with JSON Lines alongside. 'parquet' writes a columnar file instead,
+    compressed with `compression` ('zstd' at level 3 or 'snappy'); JSON is skipped in that
+    mode since it can be derived from the parquet.
+    """
     batch_dir = BATCH_OUTPUT_DIR / f'batch{batch_num}'
     batch_dir.mkdir(parents=True, exist_ok=True)
     
     logger.info(f"\\nSaving batch {batch_num} (locations {location_range[0]}-{location_range[1]})...")
     
-    # save csv
-    csv_path = batch_dir / f'batch{batch_num}_weather_data.csv'
-    df.to_csv(csv_path, index=False)
-    logger.info(f"  Saved CSV: {csv_path}")
+    data_path = get_batch_data_path(batch_num, output_format)
+    if output_format == 'parquet':
+        if compression not in PARQUET_COMPRESSIONS:
+            raise ValueError(f"Unsupported parquet compression: {compression}")
+        df.to_parquet(
+            data_path,
+            engine='pyarrow',
+            compression=compression,
+            compression_level=3 if compression == 'zstd' else None,
+            row_group_size=50_000,
+            index=False
+        )
+        logger.info(f"  Saved Parquet: {data_path}")
+    else:
+        write_csv(df, data_path)
+        logger.info(f"  Saved CSV: {data_path}")
     
-    # save json if requested
-    if save_json:
-        json_path = batch_dir / f'batch{batch_num}_weather_data.json'
-        df.to_json(json_path, orient='records', force_ascii=False, indent=2)
-        logger.info(f"  Saved JSON: {json_path}")
+    # save json if requested (csv mode only) - one compact record per line (JSON Lines)
+    if save_json and output_format == 'csv':
+        json_path = batch_dir / f'batch{batch_num}_weather_data.jsonl'
+        df.to_json(json_path, orient='records', lines=True, force_ascii=False)
+        logger.info(f"  Saved JSON Lines: {json_path}")
     
     # save metadata
+    stats = summarize_output(df)
+    temperature_range = stats.pop('temperature_range', None)
     metadata = {
         'batch_number': batch_num,
         'location_range': {
             'start': location_range[0],
             'end': location_range[1]
         },
-        'total_records': int(len(df)),
-        'unique_cities': int(df['city'].nunique()),
-        'unique_countries': int(df['country'].nunique()),
-        'date_range': {
-            'min': df['date'].min(),
-            'max': df['date'].max()
-        },
+        **stats,
         'processing_timestamp': datetime.now().isoformat()
     }
     
-    if 'TAVG' in df.columns:
-        metadata['temperature_range'] = {
-            'min': float(df['TAVG'].min()),
-            'max': float(df['TAVG'].max())
-        }
+    if temperature_range is not None:
+        metadata['temperature_range'] = temperature_range
     
     metadata_path = batch_dir / f'batch{batch_num}_metadata.json'
     with open(metadata_path, 'w') as f:
@@ -137,8 +300,24 @@ def save_batch_output(df: pd.DataFrame, batch_num: int, location_range: tuple, s
     logger.info(f"  Batch {batch_num} complete: {len(df):,} records")
 
 
+def save_processing_summary(summary: dict) -> Path:
+    """
+    Write the batch processing summary atomically.
+
+    Called after every batch, so the summary is written to a temp file and moved into
+    place with os.replace - a crash (or a sync client reading the file) never sees a
+    half-written JSON.
+    """
+    summary_path = BATCH_OUTPUT_DIR / 'processing_summary.json'
+    tmp_path = summary_path.with_suffix('.json.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(summary, f, indent=2)
+    os.replace(tmp_path, summary_path)
+    return summary_path
+
+
 def save_final_output(df: pd.DataFrame, output_dir: str, save_json: bool = True):
-    """Save final cleaned data to CSV and optionally JSON."""
+    """Save final cleaned data to CSV and optionally JSON Lines."""
     logger.info("Saving final output...")
     
     output_path = Path(output_dir)
@@ -146,34 +325,32 @@ def save_final_output(df: pd.DataFrame, output_dir: str, save_json: bool = True)
     
     # Save CSV
     csv_path = output_path / 'global_weather_data_cleaned.csv'
-    df.to_csv(csv_path, index=False)
+    write_csv(df, csv_path)
     logger.info(f"Saved CSV to: {csv_path}")
     
-    # Save JSON if requested
+    # Save JSON if requested (JSON Lines: one compact record per line)
     if save_json:
-        json_path = output_path / 'global_weather_data_cleaned.json'
-        df.to_json(json_path, orient='records', force_ascii=False, indent=2)
-        logger.info(f"Saved JSON to: {json_path}")
+        json_path = output_path / 'global_weather_data_cleaned.jsonl'
+        df.to_json(json_path, orient='records', lines=True, force_ascii=False)
+        logger.info(f"Saved JSON Lines to: {json_path}")
     
     # Print summary statistics
+    stats = summarize_output(df)
     logger.info("\\n=== Summary Statistics ===")
-    logger.info(f"Total records: {len(df):,}")
-    logger.info(f"Unique cities: {df['city'].nunique():,}")
-    logger.info(f"Unique countries: {df['country'].nunique():,}")
-    logger.info(f"Date range: {df['date'].min()} to {df['date'].max()}")
+    logger.info(f"Total records: {stats['total_records']:,}")
+    logger.info(f"Unique cities: {stats['unique_cities']:,}")
+    logger.info(f"Unique countries: {stats['unique_countries']:,}")
+    logger.info(f"Date range: {stats['date_range']['min']} to {stats['date_range']['max']}")
     
-    if 'TAVG' in df.columns:
-        logger.info(f"Temperature range: {df['TAVG'].min():.1f}°C to {df['TAVG'].max():.1f}°C")
+    if 'temperature_range' in stats:
+        logger.info(f"Temperature range: {stats['temperature_range']['min']:.1f}°C to {stats['temperature_range']['max']:.1f}°C")
     
     # Save summary statistics
     summary = {
-        'total_records': int(len(df)),
-        'unique_cities': int(df['city'].nunique()),
-        'unique_countries': int(df['country'].nunique()),
-        'date_range': {
-            'min': df['date'].min(),
-            'max': df['date'].max()
-        },
+        'total_records': stats['total_records'],
+        'unique_cities': stats['unique_cities'],
+        'unique_countries': stats['unique_countries'],
+        'date_range': stats['date_range'],
         'processing_timestamp': datetime.now().isoformat()
     }
     
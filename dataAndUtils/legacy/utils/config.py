@@ -8,6 +8,16 @@ used across the weather data processing pipeline.
 from pathlib import Path
 import logging
 
+import pandas as pd
+
+# Copy-on-Write: slices/column selections are cheap views until written to, so the
+# pipeline never needs defensive .copy() calls. Always on from pandas 3.0 (where the
+# option is deprecated), opt-in on pandas 2.x. The flip side: to_numpy() of a column that
+# already has the requested dtype is a read-only view, so never write into it in place
+# (np.* out=, slice assignment) - write into a new array instead
+if int(pd.__version__.split('.')[0]) < 3:
+    pd.set_option('mode.copy_on_write', True)
+
 # Setup logging
 logging.basicConfig(
     level=logging.INFO,
@@ -56,9 +66,17 @@ MATCHING_VERSION = "v4_population_radius_averaged"  # Version marker for checkpo
 # ============================================================================
 
 def get_checkpoint_path() -> Path:
-    """Get the path to the geocoding checkpoint file."""
+    """Get the path to the geocoding checkpoint file (legacy csv checkpoint)."""
     return CITY_DATA_DIR / 'geocoding_checkpoint.csv'
 
+def get_checkpoint_parts_dir() -> Path:
+    """Get the directory of the append-only geocoding checkpoint part files (parquet)."""
+    return CITY_DATA_DIR / 'geocoding_checkpoint_parts'
+
+def get_nominatim_cache_path() -> Path:
+    """Get the path to the sqlite cache of raw Nominatim responses."""
+    return CITY_DATA_DIR / 'nominatim_cache.sqlite'
+
 def get_progress_path() -> Path:
     """Get the path to the geocoding progress metadata file."""
     return CITY_DATA_DIR / 'geocoding_progress.json'
@@ -102,44 +102,105 @@ INPUT FORMAT:
         - AVG: Average value across years (temperatures in tenths of degrees C)
 """
 
+import gc
+import io
+import numpy as np
 import pandas as pd
 import zipfile
 import pickle
-import tempfile
-import shutil
 from pathlib import Path
-from typing import Union
+from typing import List, Optional, Union
+
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
 
 # Handle both direct execution and package import
 try:
     from .config import logger, UNCLEANED_DATA_DIR
+    from .data_processor import coordinate_keys
 except ImportError:
     from config import logger, UNCLEANED_DATA_DIR
+    from data_processor import coordinate_keys
+
+
+# Read buffer for streaming the pickle out of the zip archive
+PICKLE_READ_BUFFER_SIZE = 4 * 1024 * 1024
+
+# Columns of the raw weather data that the pipeline uses (AVG is renamed to value on load)
+WEATHER_COLUMNS = ['id', 'date', 'data_type', 'lat', 'long', 'name', 'AVG', 'value']
+
+# Block size for the multithreaded pyarrow csv reader (each block is parsed on its own thread)
+CSV_READ_BLOCK_SIZE = 64 * 1024 * 1024
+
+def mmdd_to_datetime(mmdd: pd.Series, year: int = 2020) -> pd.Series:
+    """
+    convert MMDD dates (e.g. 101 or '0101' = January 1st) to datetimes in the given year.
+    
+    month and day are split off with integer arithmetic and assembled by pandas'
+    vectorized year/month/day constructor - no per-row strings are built or parsed.
+    there are at most 366 distinct dates, so only those are converted and the result
+    is gathered back to the rows by their factorize codes.
+    
+    args:
+        mmdd: series of MMDD dates (int or str)
+        year: year to put the dates in
+    
+    returns:
+        datetime series (NaT for invalid dates such as 0230)
+    """
+    codes, unique_mmdd = pd.factorize(mmdd)
+    mmdd_int = pd.to_numeric(pd.Series(unique_mmdd), errors='coerce')
+    unique_dates = pd.to_datetime(
+        pd.DataFrame({'year': year, 'month': mmdd_int // 100, 'day': mmdd_int % 100}),
+        errors='coerce'
+    )
+    # code -1 (missing MMDD) becomes NaT
+    return pd.Series(unique_dates.array.take(codes, allow_fill=True), index=mmdd.index)
+
+
+def get_parquet_sidecar_path(pickle_zip_path: str) -> Path:
+    """get the path of the parquet copy written next to a .pkl.zip file."""
+    input_path = Path(pickle_zip_path)
+    name = input_path.name
+    for suffix in ('.pkl.zip', '.zip'):
+        if name.endswith(suffix):
+            name = name[:-len(suffix)]
+            break
+    return input_path.with_name(f"{name}.parquet")
 
 
 def read_from_pickle_zip(pickle_zip_path: str) -> pd.DataFrame:
     """
     read weather data from a zipped pickle file.
     
+    if a parquet copy (see convert_pickle_zip_to_parquet) exists next to the zip and
+    is newer than it, that copy is read instead.
+    
     args:
         pickle_zip_path: path to zipped pickle file (.pkl.zip)
     
     returns:
         dataframe with weather data
     """
-    logger.info("reading weather data from zipped pickle file...")
-    logger.info(f"reading from: {pickle_zip_path}")
-    
     input_path = Path(pickle_zip_path)
     if not input_path.exists():
         raise FileNotFoundError(f"pickle zip file not found: {pickle_zip_path}")
     
+    sidecar_path = get_parquet_sidecar_path(pickle_zip_path)
+    if sidecar_path.exists() and sidecar_path.stat().st_mtime >= input_path.stat().st_mtime:
+        logger.info(f"found up-to-date parquet copy of the pickle: {sidecar_path}")
+        return read_from_parquet(str(sidecar_path))
+    
+    logger.info("reading weather data from zipped pickle file...")
+    logger.info(f"reading from: {pickle_zip_path}")
+    
     # check file size
     file_size_mb = input_path.stat().st_size / (1024 * 1024)
     logger.info(f"input file size: {file_size_mb:.1f} mb")
     
-    # extract pickle to temp location and read with pandas
-    logger.info("extracting pickle from zip file...")
+    # stream the pickle straight out of the zip (no temp copy on disk)
+    logger.info("reading pickle from zip file...")
     
     with zipfile.ZipFile(input_path, 'r') as zip_ref:
         # get the pickle file name (should be the only file in the zip)
@@ -150,44 +211,197 @@ def read_from_pickle_zip(pickle_zip_path: str) -> pd.DataFrame:
         pickle_filename = pickle_files[0]
         logger.info(f"found pickle file: {pickle_filename}")
         
-        # extract to temporary directory
-        with tempfile.TemporaryDirectory() as temp_dir:
-            temp_pickle_path = Path(temp_dir) / pickle_filename
-            with zip_ref.open(pickle_filename) as source, open(temp_pickle_path, 'wb') as target:
-                shutil.copyfileobj(source, target)
-            
-            # use pandas read_pickle for better version compatibility
-            logger.info("loading pickle data with pandas (handles version compatibility)...")
-            df_weather = pd.read_pickle(temp_pickle_path)
+        # decompress while unpickling instead of extracting to a temp file first
+        # (use pandas read_pickle for better version compatibility)
+        logger.info("loading pickle data with pandas (handles version compatibility)...")
+        # ZipExtFile.read is python-level per call - a large buffer means fewer, bigger reads
+        try:
+            with zip_ref.open(pickle_filename) as source, \
+                    io.BufferedReader(source, buffer_size=PICKLE_READ_BUFFER_SIZE) as buffered:
+                df_weather = pd.read_pickle(buffered)
+        except io.UnsupportedOperation:
+            # pandas' compat unpickler (older pickles) rewinds the stream, which a zip
+            # entry can't always do - unpickle from memory instead, still no temp file
+            logger.info("zip stream not rewindable, unpickling from memory...")
+            df_weather = pd.read_pickle(io.BytesIO(zip_ref.read(pickle_filename)))
     
     logger.info(f"loaded {len(df_weather):,} weather records from pickle")
 
     print(df_weather.head)
     
+    return _prepare_weather_frame(df_weather, 'pickle')
+
+
+def _save_parquet_sidecar(df_weather: pd.DataFrame, sidecar_path: Path):
+    """save the pipeline columns of prepared weather data as the parquet copy of a pickle zip."""
+    columns = [col for col in WEATHER_COLUMNS if col in df_weather.columns]
+    logger.info(f"saving parquet copy of the weather data to: {sidecar_path}")
+    df_weather[columns].to_parquet(
+        sidecar_path,
+        engine='pyarrow',
+        compression='zstd',
+        compression_level=1,
+        row_group_size=500_000,
+        index=False
+    )
+    
+    file_size_mb = sidecar_path.stat().st_size / (1024 * 1024)
+    logger.info(f"parquet copy saved ({file_size_mb:.1f} mb)")
+
+
+def convert_pickle_zip_to_parquet(pickle_zip_path: str) -> pd.DataFrame:
+    """
+    read a zipped pickle once and save it as parquet next to the zip.
+    
+    only the pipeline columns are written (already prepared: value column, parsed
+    dates, categorical data_type), zstd level 1 compressed. later runs with the same
+    --input-pickle-zip pick the parquet copy up automatically.
+    
+    args:
+        pickle_zip_path: path to zipped pickle file (.pkl.zip)
+    
+    returns:
+        dataframe with weather data (same as read_from_pickle_zip)
+    """
+    sidecar_path = get_parquet_sidecar_path(pickle_zip_path)
+    if sidecar_path.exists():
+        # make sure the pickle itself is read, not the existing (possibly stale) copy
+        sidecar_path.unlink()
+    
+    df_weather = read_from_pickle_zip(pickle_zip_path)
+    _save_parquet_sidecar(df_weather, sidecar_path)
+    
+    return df_weather
+
+
+def read_from_parquet(parquet_path: str, columns: Optional[List[str]] = None,
+                      filters: Optional[list] = None) -> pd.DataFrame:
+    """
+    read weather data from a parquet file (e.g. the pickle data saved with to_parquet).
+    
+    only the requested columns are read from disk, so the per-year value columns of
+    the pickle data (value2016...value2020) never get loaded. filters are pushed down
+    to pyarrow, so row groups whose min/max statistics rule them out are skipped
+    without being decoded.
+    
+    args:
+        parquet_path: path to parquet file
+        columns: columns to read (default: the columns the pipeline uses)
+        filters: pyarrow row filters, e.g. [('lat', '>=', 51.3), ('lat', '<=', 51.7)]
+            (default: all rows)
+    
+    returns:
+        dataframe with weather data
+    """
+    logger.info("reading weather data from parquet file...")
+    logger.info(f"reading from: {parquet_path}")
+    
+    input_path = Path(parquet_path)
+    if not input_path.exists():
+        raise FileNotFoundError(f"parquet file not found: {parquet_path}")
+    
+    # check file size
+    file_size_mb = input_path.stat().st_size / (1024 * 1024)
+    logger.info(f"input file size: {file_size_mb:.1f} mb")
+    
+    if columns is None:
+        # id/date/data_type may be stored as the (multi)index - pandas restores those
+        # automatically, so only ask for the ones stored as regular columns
+        available = set(pq.read_schema(input_path).names)
+        columns = [col for col in WEATHER_COLUMNS if col in available]
+    
+    df_weather = pd.read_parquet(input_path, engine='pyarrow', columns=columns, filters=filters)
+    logger.info(f"loaded {len(df_weather):,} weather records from parquet")
+    
+    return _prepare_weather_frame(df_weather, 'parquet')
+
+
+def _index_to_columns(df_weather: pd.DataFrame) -> pd.DataFrame:
+    """
+    move the (multi)index of the pickle data into columns, like reset_index().
+    
+    the id/data_type levels of a multiindex are already stored as distinct values +
+    integer codes, so they become categoricals straight from those codes instead of
+    being expanded into one python string per row first.
+    
+    args:
+        df_weather: dataframe with id/date/data_type in the index
+    
+    returns:
+        dataframe with the index levels as leading columns and a default index
+    """
+    index = df_weather.index
+    if not isinstance(index, pd.MultiIndex):
+        return df_weather.reset_index()
+    
+    df_weather = df_weather.reset_index(drop=True)
+    for position, (name, level, codes) in enumerate(zip(index.names, index.levels, index.codes)):
+        if name in ('id', 'data_type'):
+            level = level.rename(None)
+            values = pd.Categorical.from_codes(codes, categories=level)
+            # same categories as astype('category'): sorted, and only the values that occur
+            if not level.is_monotonic_increasing:
+                values = values.reorder_categories(level.sort_values())
+            values = values.remove_unused_categories()
+        else:
+            values = index.get_level_values(position)
+        df_weather.insert(position, name, values)
+    return df_weather
+
+
+def _prepare_weather_frame(df_weather: pd.DataFrame, source: str) -> pd.DataFrame:
+    """
+    bring raw pickle/parquet weather data into the df_weather structure.
+    
+    args:
+        df_weather: dataframe as loaded from the file
+        source: file type, for log messages
+    
+    returns:
+        dataframe with id, date, data_type, lat, long, name, value columns
+    """
     # log the actual structure
-    logger.info(f"pickle file columns: {list(df_weather.columns)}")
-    logger.info(f"pickle file index: {df_weather.index.names}")
-    logger.info(f"pickle file shape: {df_weather.shape}")
+    logger.info(f"{source} file columns: {list(df_weather.columns)}")
+    logger.info(f"{source} file index: {df_weather.index.names}")
+    logger.info(f"{source} file shape: {df_weather.shape}")
     
     # check if id, date, data_type are in the index (multiindex)
     if df_weather.index.names and any(name in ['id', 'date', 'data_type'] for name in df_weather.index.names):
         logger.info("detected multiindex with id/date/data_type - resetting index to convert to columns")
-        df_weather = df_weather.reset_index()
+        df_weather = _index_to_columns(df_weather)
         logger.info(f"after reset_index, columns: {list(df_weather.columns)}")
     
     # validate that we have the expected columns
     required_cols = ['id', 'date', 'data_type', 'lat', 'long', 'name']
     missing_cols = [col for col in required_cols if col not in df_weather.columns]
     if missing_cols:
-        logger.error(f"pickle data missing required columns: {missing_cols}")
+        logger.error(f"{source} data missing required columns: {missing_cols}")
         logger.error(f"available columns: {list(df_weather.columns)}")
-        raise ValueError(f"pickle data missing required columns: {missing_cols}")
+        raise ValueError(f"{source} data missing required columns: {missing_cols}")
     
     # check for value column (might be 'AVG' or 'value')
     if 'AVG' in df_weather.columns:
         df_weather.rename(columns={'AVG': 'value'}, inplace=True)
     elif 'value' not in df_weather.columns:
-        raise ValueError("pickle data missing 'AVG' or 'value' column")
+        raise ValueError(f"{source} data missing 'AVG' or 'value' column")
+    
+    # the per-year value columns of the pickle (value2016...value2020) are averaged into
+    # value already - drop them instead of carrying five float64 columns through the pipeline
+    df_weather = df_weather[[col for col in WEATHER_COLUMNS if col in df_weather.columns]]
+    
+    # id/data_type/name are python strings in the pickle but only have a few dozen to a few
+    # thousand distinct values - store them as category (same as the csv reader for
+    # data_type) before anything else touches them, so every later step (null check,
+    # pivot, batching) works on integer codes
+    for col in ('id', 'data_type', 'name'):
+        if not isinstance(df_weather[col].dtype, pd.CategoricalDtype):
+            df_weather[col] = df_weather[col].astype('category')
+    
+    # the pickle stores lat/long/value as float64 - shrink them to the csv reader's float32
+    # (3-decimal coordinates and tenths-of-a-unit values fit easily)
+    for col in ('lat', 'long', 'value'):
+        if df_weather[col].dtype != 'float32':
+            df_weather[col] = df_weather[col].astype('float32')
     
     # data validation
     null_counts = df_weather.isnull().sum()
@@ -195,16 +409,18 @@ def read_from_pickle_zip(pickle_zip_path: str) -> pd.DataFrame:
         logger.warning(f"null values found:\\n{null_counts[null_counts > 0]}")
     
     # format date column if needed
-    if df_weather['date'].dtype != 'datetime64[ns]':
+    if not pd.api.types.is_datetime64_any_dtype(df_weather['date']):
         logger.info("formatting date column...")
-        df_weather['date'] = ((df_weather['date'].astype(str).str.zfill(4)) + '2020')
-        df_weather['date'] = pd.to_datetime(df_weather['date'], format='%m%d%Y', errors='coerce')
+        df_weather['date'] = mmdd_to_datetime(df_weather['date'])
         
         # check for invalid dates
         invalid_dates = df_weather['date'].isnull().sum()
         if invalid_dates > 0:
             logger.warning(f"found {invalid_dates:,} invalid dates, dropping these rows")
-            df_weather = df_weather.dropna(subset=['date'])
+            df_weather.dropna(subset=['date'], inplace=True)
+    
+    # release the replaced float64/object columns before the pipeline continues
+    gc.collect()
     
     return df_weather
 
@@ -230,21 +446,34 @@ def read_and_prepare_data(input_csv: str) -> pd.DataFrame:
     file_size_mb = input_path.stat().st_size / (1024 * 1024)
     logger.info(f"Input file size: {file_size_mb:.1f} MB")
     
-    # Read the data with dtype optimization
-    dtype_dict = {
-        'id': 'str',
-        'date': 'int32',
-        'data_type': 'category',
-        'lat': 'float32',
-        'long': 'float32',
-        'name': 'str',
-        'AVG': 'float32'
+    # Read the data with dtype optimization - pyarrow parses blocks of the file on all
+    # cores (pandas' c parser is single threaded); data_type is dictionary encoded so it
+    # arrives as a category
+    column_types = {
+        'id': pa.string(),
+        'date': pa.int32(),
+        'data_type': pa.dictionary(pa.int32(), pa.string()),
+        'lat': pa.float32(),
+        'long': pa.float32(),
+        'name': pa.string(),
+        'AVG': pa.float32()
     }
     
-    df_weather = pd.read_csv(
+    table = pa_csv.read_csv(
         input_csv,
-        usecols=['id', 'date', 'data_type', 'lat', 'long', 'name', 'AVG'],
-        dtype=dtype_dict
+        read_options=pa_csv.ReadOptions(block_size=CSV_READ_BLOCK_SIZE, use_threads=True),
+        convert_options=pa_csv.ConvertOptions(
+            include_columns=list(column_types),
+            column_types=column_types
+        )
+    )
+    # self_destruct frees each arrow column as soon as it has been converted
+    df_weather = table.to_pandas(split_blocks=True, self_destruct=True)
+    del table
+    # arrow dictionaries are in order of appearance - sort them like pandas categories so
+    # the pivoted data type columns come out in the same order
+    df_weather['data_type'] = df_weather['data_type'].cat.reorder_categories(
+        sorted(df_weather['data_type'].cat.categories)
     )
     
     logger.info(f"Loaded {len(df_weather):,} weather records")
@@ -256,8 +485,7 @@ def read_and_prepare_data(input_csv: str) -> pd.DataFrame:
     
     # Rename and format
     df_weather.rename(columns={'AVG': 'value'}, inplace=True)
-    df_weather['date'] = ((df_weather['date'].astype(str).str.zfill(4)) + '2020')
-    df_weather['date'] = pd.to_datetime(df_weather['date'], format='%m%d%Y', errors='coerce')
+    df_weather['date'] = mmdd_to_datetime(df_weather['date'])
     
     # Check for invalid dates
     invalid_dates = df_weather['date'].isnull().sum()
@@ -281,23 +509,25 @@ def get_unique_locations(df_weather: pd.DataFrame) -> pd.DataFrame:
     logger.info("Getting unique locations from weather data...")
     
     # Remove invalid coordinates
-    valid_coords = (
-        (df_weather['lat'].between(-90, 90)) &
-        (df_weather['long'].between(-180, 180))
-    )
-    invalid_count = (~valid_coords).sum()
+    lat = df_weather['lat'].to_numpy(dtype=np.float64)
+    long = df_weather['long'].to_numpy(dtype=np.float64)
+    valid_coords = (lat >= -90) & (lat <= 90) & (long >= -180) & (long <= 180)
+    invalid_count = int((~valid_coords).sum())
     if invalid_count > 0:
         logger.warning(f"Removing {invalid_count:,} records with invalid coordinates")
-        df_weather = df_weather[valid_coords]
-    
-    unique_locs = df_weather[['lat', 'long']].drop_duplicates().reset_index(drop=True)
-    logger.info(f"Found {len(unique_locs):,} unique weather station locations")
+        lat = lat[valid_coords]
+        long = long[valid_coords]
     
     # Round coordinates to reduce near-duplicate locations
-    # Using 4 decimals (~11m precision) instead of 3 (~111m) to avoid merging nearby stations
-    unique_locs['lat'] = unique_locs['lat'].round(4)
-    unique_locs['long'] = unique_locs['long'].round(4)
-    unique_locs = unique_locs.drop_duplicates().reset_index(drop=True)
+    # Using 4 decimals (~11m precision) instead of 3 (~111m) to avoid merging nearby stations.
+    # Dedup on the packed int64 key of the rounded pair (one integer np.unique instead of
+    # two float drop_duplicates), keeping locations in order of first appearance
+    _, first_idx = np.unique(coordinate_keys(lat, long), return_index=True)
+    first_idx.sort()
+    unique_locs = pd.DataFrame({
+        'lat': np.round(lat[first_idx], 4),
+        'long': np.round(long[first_idx], 4)
+    })
     logger.info(f"After rounding to 4 decimals: {len(unique_locs):,} unique locations")
     
     return unique_locs
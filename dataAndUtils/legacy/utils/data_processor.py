@@ -44,14 +44,211 @@ OUTPUT FORMAT:
         - PRCP: Precipitation in mm (from tenths)
 """
 
+import numpy as np
+from sklearn.neighbors import BallTree
 import pandas as pd
 from pathlib import Path
 
 # Handle both direct execution and package import
 try:
     from .config import logger, get_unmatched_coords_path
+    from .batch_manager import write_csv
 except ImportError:
     from config import logger, get_unmatched_coords_path
+    from batch_manager import write_csv
+
+
+# Mean earth radius, for converting haversine (radian) distances to meters
+EARTH_RADIUS_M = 6_371_000
+
+# Fixed point scale for coordinate keys (4 decimals, same as the coordinate rounding)
+COORD_KEY_SCALE = 10_000
+
+# Low-cardinality string columns of geocoded_data that are stored as categoricals
+LOCATION_CATEGORY_COLS = ['city', 'country', 'state', 'suburb', 'city_ascii',
+                          'iso2', 'iso3', 'capital', 'data_source']
+
+
+def categorize_location_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Convert the repetitive location string columns to categorical dtype.
+
+    Weather rows inherit these columns in every batch merge; as categoricals they are
+    copied as integer codes instead of python string pointers, and sorts/groupbys on
+    them run on the codes.
+    """
+    for col in LOCATION_CATEGORY_COLS:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+    return df
+
+
+def geohash_cells(lat, long, precision: int = 5) -> np.ndarray:
+    """
+    Compute the geohash of each coordinate as an integer (vectorized).
+
+    A geohash interleaves longitude and latitude bits (longitude first), so sorting by
+    it walks a Z-order curve: nearby coordinates get nearby values. Precision 5 gives
+    ~4.9km x 4.9km cells, same as a 5 character geohash string.
+
+    Args:
+        lat: array-like of latitudes
+        long: array-like of longitudes
+        precision: geohash length in characters (5 bits each)
+
+    Returns:
+        int64 array of geohash cell ids
+    """
+    total_bits = precision * 5
+    long_bits = (total_bits + 1) // 2
+    lat_bits = total_bits // 2
+
+    lat_q = ((np.asarray(lat, dtype=np.float64) + 90.0) / 180.0 * (1 << lat_bits)).astype(np.int64)
+    long_q = ((np.asarray(long, dtype=np.float64) + 180.0) / 360.0 * (1 << long_bits)).astype(np.int64)
+    lat_q = np.clip(lat_q, 0, (1 << lat_bits) - 1)
+    long_q = np.clip(long_q, 0, (1 << long_bits) - 1)
+
+    cells = np.zeros(len(lat_q), dtype=np.int64)
+    for i in range(total_bits):
+        if i % 2 == 0:
+            bit = (long_q >> (long_bits - 1 - i // 2)) & 1
+        else:
+            bit = (lat_q >> (lat_bits - 1 - i // 2)) & 1
+        cells = (cells << 1) | bit
+    return cells
+
+
+def _sort_codes(series: pd.Series) -> np.ndarray:
+    """Integer codes that sort like the values (missing values last, as in sort_values)."""
+    categorical = series.cat if isinstance(series.dtype, pd.CategoricalDtype) else pd.Categorical(series)
+    codes = np.asarray(categorical.codes, dtype=np.int64)
+    return np.where(codes < 0, len(categorical.categories), codes)
+
+
+def sort_locations_for_batching(geocoded_data: pd.DataFrame) -> pd.DataFrame:
+    """
+    Sort geocoded locations so same-city stations stay together in a batch.
+
+    Cities are ordered by the lowest geohash among their stations, so geographically
+    adjacent cities end up in the same or neighbouring batches. Within a city,
+    stations are ordered by lat/long.
+
+    The sort is a single np.lexsort over integer category codes rather than a
+    sort_values over the string columns.
+    """
+    city_cols = [col for col in ['city', 'country', 'state'] if col in geocoded_data.columns]
+    cells = pd.Series(geohash_cells(geocoded_data['lat'], geocoded_data['long']), index=geocoded_data.index)
+    city_cell = cells.groupby(
+        [geocoded_data[col] for col in city_cols], observed=True, dropna=False, sort=False
+    ).transform('min')
+
+    # np.lexsort sorts by the last key first
+    sort_keys = [geocoded_data['long'].to_numpy(), geocoded_data['lat'].to_numpy()]
+    sort_keys += [_sort_codes(geocoded_data[col]) for col in reversed(city_cols)]
+    sort_keys.append(city_cell.to_numpy())
+    order = np.lexsort(sort_keys)
+
+    # no reset_index: everything downstream addresses locations by position (iloc / numpy)
+    return geocoded_data.iloc[order]
+
+
+def get_batch_ranges(geocoded_data: pd.DataFrame, batch_size: int) -> list:
+    """
+    Split sorted geocoded locations into batches that never split a city.
+
+    Expects the output of sort_locations_for_batching (same-city stations are
+    contiguous). A batch is closed before the city that would push it over
+    batch_size locations; a single city larger than batch_size gets a batch of its own.
+
+    Args:
+        geocoded_data: sorted geocoded locations
+        batch_size: target number of locations per batch
+
+    Returns:
+        list of (start, end) positional ranges, end exclusive
+    """
+    total = len(geocoded_data)
+    if total == 0:
+        return []
+
+    city_cols = [col for col in ['city', 'country', 'state'] if col in geocoded_data.columns]
+    # a new city starts wherever any of the city columns changes
+    city_starts = np.zeros(total, dtype=bool)
+    city_starts[0] = True
+    for col in city_cols:
+        codes = _sort_codes(geocoded_data[col])
+        city_starts[1:] |= codes[1:] != codes[:-1]
+    if not city_cols:
+        city_starts[:] = True
+    city_bounds = np.append(np.flatnonzero(city_starts), total)
+
+    ranges = []
+    batch_start = 0
+    for city_start, city_end in zip(city_bounds[:-1], city_bounds[1:]):
+        if city_end - batch_start > batch_size and city_start > batch_start:
+            ranges.append((batch_start, int(city_start)))
+            batch_start = int(city_start)
+    ranges.append((batch_start, total))
+    return ranges
+
+
+def coordinate_keys(lat, long) -> np.ndarray:
+    """
+    Pack lat/long pairs into single int64 join keys.
+
+    Each coordinate is stored as 4 decimal fixed point (~11m precision), latitude in
+    the high 32 bits and longitude in the low 32 bits. Joining on one integer column
+    is cheaper than a two-column float join and avoids float equality issues.
+
+    Args:
+        lat: array-like of latitudes
+        long: array-like of longitudes
+
+    Returns:
+        int64 array of packed coordinate keys
+    """
+    lat_fixed = np.rint(np.asarray(lat, dtype=np.float64) * COORD_KEY_SCALE).astype(np.int64)
+    long_fixed = np.rint(np.asarray(long, dtype=np.float64) * COORD_KEY_SCALE).astype(np.int64)
+    return (lat_fixed << 32) | (long_fixed & 0xFFFFFFFF)
+
+
+def locate_coordinates(df_weather: pd.DataFrame, locations: pd.DataFrame,
+                       max_distance_m: float = 11.0) -> np.ndarray:
+    """
+    Find the position of each weather row's nearest location in the locations dataframe.
+
+    Uses a haversine BallTree over the location coordinates, so matching is
+    O((N + M) log M) and tolerant of rounding drift (anything within max_distance_m
+    counts as the same place - 11m is the 4 decimal rounding precision). Each distinct
+    weather coordinate is only queried once.
+
+    Args:
+        df_weather: DataFrame with lat/long columns
+        locations: DataFrame with lat/long columns (e.g. geocoded_data)
+        max_distance_m: maximum distance in meters for a match
+
+    Returns:
+        int64 array with one positional index into locations per weather row (-1 if
+        unmatched, including rows with a missing or out of range lat/long)
+    """
+    if len(locations) == 0:
+        return np.full(len(df_weather), -1, dtype=np.int64)
+
+    location_coords = np.deg2rad(locations[['lat', 'long']].to_numpy(dtype=np.float64))
+    weather_coords = df_weather[['lat', 'long']].to_numpy(dtype=np.float64)
+    unique_coords, inverse = np.unique(weather_coords, axis=0, return_inverse=True)
+
+    # NaN (the BallTree rejects it) or impossible coordinates never match - those rows
+    # are dropped as unmatched instead of aborting the run
+    valid = (np.isfinite(unique_coords).all(axis=1)
+             & (np.abs(unique_coords[:, 0]) <= 90) & (np.abs(unique_coords[:, 1]) <= 180))
+    unique_ids = np.full(len(unique_coords), -1, dtype=np.int64)
+    if valid.any():
+        tree = BallTree(location_coords, metric='haversine')
+        distances, indices = tree.query(np.deg2rad(unique_coords[valid]), k=1)
+        matched = distances[:, 0] * EARTH_RADIUS_M < max_distance_m
+        unique_ids[valid] = np.where(matched, indices[:, 0], -1)
+    return unique_ids[inverse.ravel()]
 
 
 def merge_with_original(df_weather: pd.DataFrame, unique_locs: pd.DataFrame) -> pd.DataFrame:
@@ -72,16 +269,29 @@ def merge_with_original(df_weather: pd.DataFrame, unique_locs: pd.DataFrame) ->
                      'worldcities_id', 'data_source']
     # only include columns that exist in unique_locs
     available_cols = [col for col in location_cols if col in unique_locs.columns]
-    merge_data = unique_locs[available_cols].copy()
+    merge_data = unique_locs[available_cols]
+    
+    # keep python-object string columns arrow-backed instead (contiguous buffers rather
+    # than one boxed object per value), so the join moves buffers, not object arrays
+    for col in merge_data.columns:
+        if merge_data[col].dtype == object:
+            merge_data[col] = merge_data[col].astype('string[pyarrow]')
+    
+    # join on packed int64 coordinate keys instead of a two-column float merge
+    merge_data['coord_key'] = coordinate_keys(merge_data['lat'], merge_data['long'])
     
     # DATA PROTECTION: Check for duplicates in merge key before merging
-    merge_key_dups = merge_data.duplicated(subset=['lat', 'long']).sum()
+    merge_key_dups = merge_data.duplicated(subset=['coord_key']).sum()
     if merge_key_dups > 0:
         logger.warning(f"Found {merge_key_dups} duplicate lat/long pairs in geocoded data")
         logger.warning("Keeping first occurrence of each coordinate pair")
-        merge_data = merge_data.drop_duplicates(subset=['lat', 'long'], keep='first')
+        merge_data = merge_data.drop_duplicates(subset=['coord_key'], keep='first')
     
-    df_enriched = pd.merge(df_weather, merge_data, on=['lat', 'long'], how='left')
+    merge_data = merge_data.drop(columns=['lat', 'long']).set_index('coord_key')
+    df_weather['coord_key'] = coordinate_keys(df_weather['lat'], df_weather['long'])
+    df_enriched = df_weather.join(merge_data, on='coord_key', how='left')
+    df_enriched = df_enriched.drop(columns=['coord_key']).reset_index(drop=True)
+    df_weather.drop(columns=['coord_key'], inplace=True)
     
     # DATA PROTECTION: Verify merge didn't change row count
     if len(df_enriched) != original_row_count:
@@ -98,7 +308,7 @@ def merge_with_original(df_weather: pd.DataFrame, unique_locs: pd.DataFrame) ->
         # Save unmatched coordinates for investigation
         unmatched_coords = df_enriched[df_enriched['city'].isnull()][['lat', 'long']].drop_duplicates()
         unmatched_path = get_unmatched_coords_path()
-        unmatched_coords.to_csv(unmatched_path, index=False)
+        write_csv(unmatched_coords, unmatched_path)
         logger.warning(f"Saved {len(unmatched_coords)} unmatched coordinate pairs to: {unmatched_path}")
     
     logger.info(f"Merged dataset has {len(df_enriched):,} records (verified: no data loss)")
@@ -132,16 +342,22 @@ def pivot_and_clean_data(df: pd.DataFrame) -> pd.DataFrame:
     
     # Count stations per city BEFORE aggregation
     if 'city' in df.columns and 'name' in df.columns and 'date' in df.columns:
-        station_counts = df.groupby(['city', 'date'])['name'].nunique()
+        station_counts = df.groupby(['city', 'date'], observed=True)['name'].nunique()
         cities_with_multiple = station_counts[station_counts > 1]
         if len(cities_with_multiple) > 0:
             # Get unique cities (not city-date pairs)
-            cities_list = df[df.groupby(['city', 'date'])['name'].transform('nunique') > 1]['city'].unique()
+            cities_list = cities_with_multiple.index.get_level_values('city').unique()
             logger.info(f"\n✓ Found {len(cities_list)} cities with multiple stations (will be averaged):")
-            for city in sorted(cities_list)[:10]:  # Show first 10
-                num_stations = df[df['city'] == city]['name'].nunique()
-                station_names = df[df['city'] == city]['name'].unique()
-                logger.info(f"  - {city}: {num_stations} stations ({', '.join(station_names[:3])})")
+            shown_cities = sorted(cities_list)[:10]  # Show first 10
+            # station names of the shown cities in one pass (in order of appearance)
+            station_names = (
+                df.loc[df['city'].isin(shown_cities), ['city', 'name']]
+                .groupby('city', observed=True, sort=False)['name']
+                .unique()
+            )
+            for city in shown_cities:
+                names = list(station_names[city])
+                logger.info(f"  - {city}: {len(names)} stations ({', '.join(names[:3])})")
             if len(cities_list) > 10:
                 logger.info(f"  ... and {len(cities_list) - 10} more")
     
@@ -154,6 +370,16 @@ def pivot_and_clean_data(df: pd.DataFrame) -> pd.DataFrame:
     # only include columns that exist in the dataframe
     index_cols = [col for col in base_index + additional_index if col in df.columns]
 
+    # Check for NaN in index columns before pivot (counted for all columns in one call)
+    logger.info(f"Index columns (excluding station name/coords for aggregation): {index_cols}")
+    nan_counts = df[index_cols].isnull().sum()
+    for col, nan_count in nan_counts[nan_counts > 0].items():
+        logger.warning(f"Column '{col}' has {nan_count} NaN values ({100*nan_count/len(df):.1f}%)")
+        # Fill NaN with empty string to prevent pivot issues
+        if isinstance(df[col].dtype, pd.CategoricalDtype) and '' not in df[col].cat.categories:
+            df[col] = df[col].cat.add_categories('')
+        df[col] = df[col].fillna('')
+    
     # save population column separately to add back after pivot (to avoid overflow)
     # FIX: Group by geographic identifiers (city, country, state, suburb) to avoid
     # incorrectly assigning same population to cities with same name in different locations
@@ -168,17 +394,23 @@ def pivot_and_clean_data(df: pd.DataFrame) -> pd.DataFrame:
         # This ensures cities with same name but different locations get correct populations
         # For cities without states (e.g., Amsterdam), grouping by (city, country, suburb)
         # will still correctly group all Amsterdam stations together
-        population_map = df.groupby(geo_group_cols)['population'].first()
+        # (built after the NaN fill so its keys match the filled pivot index)
+        population_map = df.groupby(geo_group_cols, observed=True)['population'].first()
         logger.info(f"✓ Created population map grouped by: {geo_group_cols}")
     
-    # Check for NaN in index columns before pivot
-    logger.info(f"Index columns (excluding station name/coords for aggregation): {index_cols}")
+    # group on category codes instead of hashing strings: convert the index columns that
+    # are still plain strings (worldcities_id, or frames that didn't go through
+    # categorize_location_columns)
     for col in index_cols:
-        nan_count = df[col].isnull().sum()
-        if nan_count > 0:
-            logger.warning(f"Column '{col}' has {nan_count} NaN values ({100*nan_count/len(df):.1f}%)")
-            # Fill NaN with empty string to prevent pivot issues
-            df[col] = df[col].fillna('')
+        if not isinstance(df[col].dtype, pd.CategoricalDtype) and pd.api.types.is_string_dtype(df[col].dtype):
+            df[col] = df[col].astype('category')
+    
+    # data_type categories are shared by every batch (68 types overall); keep only the
+    # ones present in this batch so the pivot doesn't consider types no station reported
+    if isinstance(df['data_type'].dtype, pd.CategoricalDtype):
+        df['data_type'] = df['data_type'].cat.remove_unused_categories()
+    else:
+        df['data_type'] = df['data_type'].astype('category')
     
     # Perform pivot with MEAN aggregation to average multiple stations
     # IMPORTANT: mean() automatically handles missing values:
@@ -187,12 +419,31 @@ def pivot_and_clean_data(df: pd.DataFrame) -> pd.DataFrame:
     # - If 0 stations have a type: NaN (which is correct)
     logger.info("\nPerforming pivot with MEAN aggregation (averaging multiple stations per city)...")
     logger.info("  Note: Mean preserves values from single stations (no data loss)")
-    df_pivot = df.pivot_table(
-        index=index_cols,
-        columns='data_type',
-        values='value',
-        aggfunc='mean'  # Average when multiple values exist, keep when only one exists
-    ).reset_index()
+    # number the city/date groups once (a single hash pass over the index columns, in
+    # sorted key order). the pivot and the coordinate means then group on this one int
+    # column, and the index column values are taken from each group's first row.
+    # observed=True: only number index combinations that exist (categorical location
+    # columns would otherwise expand to the full cartesian product)
+    group_id = df.groupby(index_cols, observed=True, sort=True).ngroup().to_numpy()
+    _, first_rows = np.unique(group_id, return_index=True)
+    group_keys = df[index_cols].iloc[first_rows].reset_index(drop=True)
+    
+    # groupby + unstack instead of pivot_table: group on (group id, data_type), then a
+    # reshape - pivot_table does the same work with extra copies
+    df_values = (
+        df['value'].groupby([group_id, df['data_type']], observed=True)
+        .mean()  # Average when multiple values exist, keep when only one exists
+        .unstack('data_type')
+        # same as pivot_table's dropna=True: drop all-NaN rows and measurement columns
+        .dropna(how='all')
+        .dropna(axis=1, how='all')
+    )
+    kept_groups = df_values.index.to_numpy()
+    df_values.columns = list(df_values.columns)
+    df_pivot = pd.concat(
+        [group_keys.iloc[kept_groups].reset_index(drop=True), df_values.reset_index(drop=True)],
+        axis=1
+    )
     
     logger.info(f"✓ Pivot complete! Result shape: {df_pivot.shape}")
     logger.info(f"  (Each row = one city/date with averaged data from all stations)")
@@ -201,9 +452,10 @@ def pivot_and_clean_data(df: pd.DataFrame) -> pd.DataFrame:
     # Add representative lat/long back (use mean of all stations' coordinates per city)
     if 'lat' in df.columns and 'long' in df.columns:
         logger.info("Calculating representative coordinates (mean of all stations per city)...")
-        # Group by city and get mean coordinates
-        coords_mean = df.groupby([col for col in index_cols if col in df.columns])[['lat', 'long']].mean().reset_index()
-        df_pivot = df_pivot.merge(coords_mean, on=[col for col in index_cols if col in df.columns], how='left')
+        # Group by city and get mean coordinates (same groups as the pivot, so the means
+        # line up with the pivot rows without merging back on the index columns)
+        coords_mean = df[['lat', 'long']].groupby(group_id).mean()
+        df_pivot[['lat', 'long']] = coords_mean.to_numpy()[kept_groups]
         logger.info("✓ Added representative lat/long (averaged across all stations)")
     
     # add population back after pivot
@@ -237,21 +489,20 @@ def pivot_and_clean_data(df: pd.DataFrame) -> pd.DataFrame:
                 logger.info(f"✓ Imputed {filled_count:,} missing TAVG values using improved formula")
                 logger.info("  Formula: TAVG = TMIN + 0.44 * (TMAX - TMIN)")
     
-    # Convert temperatures from tenths of degrees to degrees
-    for col in ['TMAX', 'TMIN', 'TAVG']:
-        if col in df_pivot.columns:
-            df_pivot[col] = df_pivot[col].div(10).round(2)
-    
-    # Handle precipitation if present
-    if 'PRCP' in df_pivot.columns:
-        df_pivot['PRCP'] = df_pivot['PRCP'].div(10).round(2)  # Convert to mm
-    
-    # Handle snow depth if present
-    if 'SNWD' in df_pivot.columns:
-        df_pivot['SNWD'] = df_pivot['SNWD'].div(10).round(2)  # Convert to cm
-    
-    # Format date
-    df_pivot['date'] = df_pivot['date'].dt.strftime('%Y-%m-%d')
+    # Convert temperatures from tenths of degrees to degrees, precipitation to mm and
+    # snow depth to cm - scaled as one float32 block instead of per column. with
+    # copy-on-write, to_numpy of float32 columns is a read-only view of the frame, so the
+    # divide writes a new array (the only allocation) and the round works in place on that
+    tenths_cols = [col for col in ['TMAX', 'TMIN', 'TAVG', 'PRCP', 'SNWD'] if col in df_pivot.columns]
+    if tenths_cols:
+        tenths = np.divide(df_pivot[tenths_cols].to_numpy(dtype=np.float32), np.float32(10))
+        np.round(tenths, 2, out=tenths)
+        df_pivot[tenths_cols] = tenths
+    
+    # Format date - only the distinct dates (at most 366) go through strftime, the
+    # rows pick up their string by position
+    date_codes, unique_dates = pd.factorize(df_pivot['date'])
+    df_pivot['date'] = pd.array(unique_dates.strftime('%Y-%m-%d'))[date_codes]
     
     # Data quality checks
     for col in ['TMAX', 'TMIN', 'TAVG']:
@@ -293,6 +544,7 @@ def validate_data(df: pd.DataFrame):
     
     # top countries by record count
     logger.info("\\nTop 10 countries by record count:")
-    top_countries = df['country'].value_counts().head(10)
+    top_countries = df['country'].value_counts()
+    top_countries = top_countries[top_countries > 0].head(10)  # categoricals also count unused categories
     for country, count in top_countries.items():
         logger.info(f"  {country}: {count:,}")
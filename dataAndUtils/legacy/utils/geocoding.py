@@ -57,15 +57,19 @@ WHY ONE CITY PER STATION?
 """
 
 import pandas as pd
+import random
 import time
 import json
+import sqlite3
 import numpy as np
 from pathlib import Path
 from geopy.geocoders import Nominatim
 from geopy.extra.rate_limiter import RateLimiter
-from geopy.distance import geodesic
+from joblib import Parallel, delayed
+from sklearn.neighbors import BallTree
 from datetime import datetime
 from typing import Optional, Tuple, Set
+from urllib.parse import urlparse
 
 # Handle both direct execution and package import
 try:
@@ -78,11 +82,15 @@ try:
         MATCHING_VERSION,
         DEFAULT_GEOCODING_DELAY,
         get_checkpoint_path,
+        get_checkpoint_parts_dir,
+        get_nominatim_cache_path,
         get_progress_path,
         get_failed_geocodes_path,
         get_simplified_data_path,
         get_full_data_path
     )
+    from .data_processor import coordinate_keys
+    from .batch_manager import write_csv
 except ImportError:
     from config import (
         logger,
@@ -93,11 +101,30 @@ except ImportError:
         MATCHING_VERSION,
         DEFAULT_GEOCODING_DELAY,
         get_checkpoint_path,
+        get_checkpoint_parts_dir,
+        get_nominatim_cache_path,
         get_progress_path,
         get_failed_geocodes_path,
         get_simplified_data_path,
         get_full_data_path
     )
+    from data_processor import coordinate_keys
+    from batch_manager import write_csv
+
+
+# Mean earth radius in km (haversine distances)
+EARTH_RADIUS_KM = 6371.0
+
+# Columns of a location match result (geocoded_data without lat/long)
+GEOCODED_COLUMNS = ['city', 'country', 'state', 'suburb', 'city_ascii', 'iso2', 'iso3',
+                    'capital', 'population', 'worldcities_id', 'data_source']
+
+# Stations per BallTree query when the city matching is spread over threads
+CITY_QUERY_CHUNK_SIZE = 2048
+
+# Decimals of the lat/long key of the nominatim response cache (~110m: neighbouring
+# stations share one response)
+NOMINATIM_CACHE_DECIMALS = 3
 
 
 def load_worldcities(min_population: int = MIN_POPULATION) -> Tuple[pd.DataFrame, pd.DataFrame]:
@@ -144,9 +171,13 @@ def load_worldcities(min_population: int = MIN_POPULATION) -> Tuple[pd.DataFrame
     # rename lng to long for consistency
     df_all_cities.rename(columns={'lng': 'long'}, inplace=True)
     
+    # coordinates in radians (float64) for the haversine city BallTrees -
+    # converted once here instead of on every matching call
+    df_all_cities['lat_rad'] = np.radians(df_all_cities['lat'].to_numpy(dtype=np.float64))
+    df_all_cities['long_rad'] = np.radians(df_all_cities['long'].to_numpy(dtype=np.float64))
+    
     # create major cities subset
-    df_major_cities = df_all_cities[df_all_cities['population'].notna()].copy()
-    df_major_cities = df_major_cities[df_major_cities['population'] >= min_population].copy()
+    df_major_cities = df_all_cities[df_all_cities['population'] >= min_population]
     
     logger.info(f"major cities (≥{min_population:,} population): {len(df_major_cities):,}")
     logger.info(f"all cities (any population): {len(df_all_cities):,}")
@@ -154,20 +185,6 @@ def load_worldcities(min_population: int = MIN_POPULATION) -> Tuple[pd.DataFrame
     return df_major_cities, df_all_cities
 
 
-def calculate_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-    """
-    calculate distance between two coordinates using haversine formula.
-    
-    args:
-        lat1, lon1: first coordinate
-        lat2, lon2: second coordinate
-    
-    returns:
-        distance in kilometers
-    """
-    return geodesic((lat1, lon1), (lat2, lon2)).kilometers
-
-
 def get_geographic_region(lat: float, long: float) -> dict:
     """
     Assign a descriptive region name based on coordinates.
@@ -240,152 +257,276 @@ def get_geographic_region(lat: float, long: float) -> dict:
     }
 
 
-def match_station_to_major_city(
-    station_lat: float,
-    station_lon: float,
+def city_coords_rad(df_cities: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    City latitudes/longitudes in radians (float64).
+
+    Uses the lat_rad/long_rad columns added by load_worldcities, and only converts
+    lat/long for frames that don't have them.
+    """
+    if 'lat_rad' in df_cities.columns and 'long_rad' in df_cities.columns:
+        return df_cities['lat_rad'].to_numpy(), df_cities['long_rad'].to_numpy()
+    return (np.radians(df_cities['lat'].to_numpy(dtype=np.float64)),
+            np.radians(df_cities['long'].to_numpy(dtype=np.float64)))
+
+
+def _worldcities_columns(df_cities: pd.DataFrame, positions: np.ndarray,
+                         data_source: str = 'worldcities') -> dict:
+    """Build the match result columns (GEOCODED_COLUMNS -> array) for many worldcities rows at once (by position)."""
+    rows = df_cities.iloc[positions]
+    n_rows = len(rows)
+    
+    def column(name, default):
+        return rows[name].to_numpy() if name in rows.columns else [default] * n_rows
+    
+    return {
+        'city': rows['city'].to_numpy(),
+        'country': rows['country'].to_numpy(),
+        'state': rows['admin_name'].to_numpy(),
+        'suburb': [''] * n_rows,  # No suburb info in worldcities
+        'city_ascii': column('city_ascii', ''),
+        'iso2': column('iso2', ''),
+        'iso3': column('iso3', ''),
+        'capital': column('capital', ''),
+        'population': column('population', np.nan),
+        'worldcities_id': column('id', ''),
+        'data_source': [data_source] * n_rows
+    }
+
+
+def build_city_tree(df_cities: pd.DataFrame) -> BallTree:
+    """
+    Build a haversine BallTree over city coordinates (built once, queried per batch).
+
+    Args:
+        df_cities: DataFrame of cities with lat/long columns
+
+    Returns:
+        BallTree whose indices are positions in df_cities
+    """
+    coords_rad = np.column_stack(city_coords_rad(df_cities))
+    return BallTree(coords_rad, metric='haversine')
+
+
+def match_stations_to_cities(
+    station_lats: np.ndarray,
+    station_lons: np.ndarray,
     df_cities: pd.DataFrame,
+    city_tree: BallTree,
     primary_radius_km: float = SEARCH_RADIUS_KM_PRIMARY,
     fallback_radius_km: float = SEARCH_RADIUS_KM_FALLBACK,
-    station_country: Optional[str] = None
-) -> Optional[dict]:
+    n_jobs: int = -1
+) -> np.ndarray:
     """
-    Match a weather station to the nearest major city using population-based city radius expansion.
-    
-    ALGORITHM CHANGE (v4_population_radius):
-    Instead of fixed search radii for all cities, each city gets an "effective radius" based on population.
-    This models the geographic reality that large cities span wider areas.
-    
-    Formula: effective_radius = base_radius + sqrt(population_millions) * 3
-    - London (10.9M): 20 + sqrt(10.9) * 3 = ~30km effective radius
-    - Birmingham (2.9M): 20 + sqrt(2.9) * 3 = ~25km effective radius  
-    - Reading (318k): 20 + sqrt(0.318) * 3 = ~22km effective radius
-    
-    This allows mega-cities to "reach out" to peripheral stations while keeping
-    smaller cities tightly constrained, preventing cross-border issues.
-    
-    IMPORTANT: This version does NOT use the "one city per station" restriction.
-    Multiple stations can match to the same city, which is correct behavior.
-    The downstream merge script will handle consolidating data from multiple stations.
-    
+    Match weather stations to the most populous city within reach, for many stations at once.
+
+    Each city gets an effective radius based on its population (v4_population_radius):
+    effective_radius = base_radius + sqrt(population_millions) * 3, e.g. London (10.9M)
+    reaches ~30km with the 20km primary base, Reading (318k) ~22km. The fallback base
+    radius is only used for stations with no city within the primary one. Among the
+    candidates the most populous city wins (so mega-cities win over their boroughs),
+    with distance as tiebreaker; several stations may match the same city.
+
+    Candidates come from one BallTree radius query for all stations instead of a
+    haversine against every city per station.
+
     Args:
-        station_lat: Station latitude
-        station_lon: Station longitude
-        df_cities: DataFrame of major cities
-        primary_radius_km: Base radius for primary search (default 20km)
-        fallback_radius_km: Base radius for fallback search (default 30km) - ONLY used if primary fails
-        station_country: Optional country filter for efficiency
-    
+        station_lats: station latitudes
+        station_lons: station longitudes
+        df_cities: DataFrame of cities (the one city_tree was built from)
+        city_tree: BallTree from build_city_tree(df_cities)
+        primary_radius_km: Base radius for primary search
+        fallback_radius_km: Base radius for fallback search
+        n_jobs: threads for the tree query (joblib convention, -1 = all cores)
+
     Returns:
-        Dict with city data (city, country, state, suburb, city_ascii, iso2, iso3, 
-        capital, population, worldcities_id, data_source) or None if no match
+        int64 array with the matched city's position in df_cities per station (-1 if no match)
     """
-    # CRITICAL OPTIMIZATION: vectorized distance calculation using numpy
-    # This is much faster than apply() with lambda for large datasets
-    
-    # Convert to numpy arrays for vectorization
-    lat1_rad = np.radians(station_lat)
-    lon1_rad = np.radians(station_lon)
-    lat2_rad = np.radians(df_cities['lat'].values)
-    lon2_rad = np.radians(df_cities['long'].values)
-    
-    # Haversine formula - fully vectorized with numpy
-    dlon = lon2_rad - lon1_rad
-    dlat = lat2_rad - lat1_rad
-    a = np.sin(dlat/2)**2 + np.cos(lat1_rad) * np.cos(lat2_rad) * np.sin(dlon/2)**2
-    c = 2 * np.arcsin(np.sqrt(a))
-    df_cities = df_cities.copy()
-    df_cities['distance'] = 6371 * c  # Radius of earth in km
-    
-    # Calculate population-based effective radius for each city
-    # Formula: base_radius + sqrt(population_millions) * 3
-    # This gives larger cities more "reach" to peripheral stations
-    population_millions = df_cities['population'] / 1_000_000
-    df_cities['effective_radius'] = primary_radius_km + (np.sqrt(population_millions) * 3)
-    
-    # Filter by country if provided (for efficiency)
-    if station_country:
-        df_candidates = df_cities[df_cities['country'] == station_country].copy()
-        if len(df_candidates) == 0:
-            # If no cities in same country, use all cities
-            df_candidates = df_cities.copy()
+    n_stations = len(station_lats)
+    matches = np.full(n_stations, -1, dtype=np.int64)
+
+    # population-based effective radius per city (NaN population never matches)
+    population = df_cities['population'].to_numpy(dtype=np.float64)
+    radius_bonus = np.sqrt(population / 1_000_000) * 3
+    primary_radius = primary_radius_km + radius_bonus
+    fallback_radius = fallback_radius_km + radius_bonus
+    if n_stations == 0 or not np.isfinite(fallback_radius).any():
+        return matches
+
+    # one radius query covering the largest fallback radius of any city
+    max_radius_km = max(np.nanmax(fallback_radius), np.nanmax(primary_radius))
+    stations_rad = np.deg2rad(np.column_stack([station_lats, station_lons]).astype(np.float64))
+    if n_jobs == 1 or n_stations <= CITY_QUERY_CHUNK_SIZE:
+        indices, distances = city_tree.query_radius(
+            stations_rad, r=max_radius_km / EARTH_RADIUS_KM, return_distance=True
+        )
     else:
-        df_candidates = df_cities.copy()
+        # the tree query is the expensive part - run it on chunks of stations in threads
+        # (the query releases the GIL, and threads share the tree instead of pickling it)
+        chunks = Parallel(n_jobs=n_jobs, prefer='threads')(
+            delayed(city_tree.query_radius)(
+                stations_rad[start:start + CITY_QUERY_CHUNK_SIZE],
+                r=max_radius_km / EARTH_RADIUS_KM,
+                return_distance=True
+            )
+            for start in range(0, n_stations, CITY_QUERY_CHUNK_SIZE)
+        )
+        indices = np.concatenate([chunk_indices for chunk_indices, _ in chunks])
+        distances = np.concatenate([chunk_distances for _, chunk_distances in chunks])
+
+    # flatten the per-station candidate lists into (station, city, distance) arrays
+    counts = np.fromiter((len(ind) for ind in indices), dtype=np.int64, count=n_stations)
+    if counts.sum() == 0:
+        return matches
+    station_idx = np.repeat(np.arange(n_stations), counts)
+    city_idx = np.concatenate(indices).astype(np.int64)
+    distance_km = np.concatenate(distances) * EARTH_RADIUS_KM
+
+    # PRIMARY SEARCH, then FALLBACK only for stations with no primary candidate
+    in_primary = distance_km <= primary_radius[city_idx]
+    has_primary = np.bincount(station_idx, weights=in_primary, minlength=n_stations) > 0
+    in_fallback = distance_km <= fallback_radius[city_idx]
+    selected = in_primary | (~has_primary[station_idx] & in_fallback)
+    station_idx, city_idx, distance_km = station_idx[selected], city_idx[selected], distance_km[selected]
+    if len(station_idx) == 0:
+        return matches
+
+    # per station: population (descending), then distance (ascending)
+    order = np.lexsort((city_idx, distance_km, -population[city_idx], station_idx))
+    station_sorted = station_idx[order]
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = station_sorted[1:] != station_sorted[:-1]
+    matches[station_sorted[first]] = city_idx[order][first]
+    return matches
+
+
+def load_geocoding_progress(legacy_csv_checkpoint: bool = False,
+                            unique_locs: Optional[pd.DataFrame] = None) -> Optional[pd.DataFrame]:
+    """
+    load previous geocoding progress if it exists.
     
-    # PRIMARY SEARCH: Find cities where station is within their effective radius
-    df_nearby = df_candidates[df_candidates['distance'] <= df_candidates['effective_radius']].copy()
+    args:
+        legacy_csv_checkpoint: read the single csv checkpoint instead of the parquet part files
+        unique_locs: if given, only checkpoint rows for these lat/long pairs are returned
     
-    # FALLBACK SEARCH: Only if primary search finds nothing, try expanded radius
-    # This is much stricter than before - we only fall back if NO cities are found
-    if len(df_nearby) == 0:
-        # Calculate fallback effective radius (using fallback_radius_km as base)
-        df_candidates['fallback_effective_radius'] = fallback_radius_km + (np.sqrt(population_millions) * 3)
-        df_nearby = df_candidates[df_candidates['distance'] <= df_candidates['fallback_effective_radius']].copy()
-        
-        if len(df_nearby) > 0:
-            logger.debug(f"No cities within population-adjusted primary radius, using fallback")
+    returns:
+        dataframe of geocoded locations, or None if there is no (compatible) checkpoint
+    """
+    checkpoint_path = get_checkpoint_path()
+    parts_dir = get_checkpoint_parts_dir()
+    progress_path = get_progress_path()
     
-    # If still no cities, return None (will use next tier fallback: Tier 2/3/4)
-    if len(df_nearby) == 0:
+    part_paths = [] if legacy_csv_checkpoint else sorted(parts_dir.glob('part_*.parquet'))
+    if part_paths:
+        logger.info(f"found existing geocoding checkpoint: {parts_dir} ({len(part_paths)} parts)")
+    elif checkpoint_path.exists():
+        # legacy csv checkpoint (or one written by a run from before the parquet parts)
+        logger.info(f"found existing geocoding checkpoint: {checkpoint_path}")
+    else:
         return None
     
-    # Sort by population (descending) then distance (ascending)
-    # This ensures mega-cities win over their boroughs when both are in range
-    df_nearby = df_nearby.sort_values(['population', 'distance'], ascending=[False, True])
+    # check version compatibility
+    if progress_path.exists():
+        with open(progress_path, 'r') as f:
+            progress_info = json.load(f)
+            checkpoint_version = progress_info.get('matching_version', 'v1_nominatim')
+            
+            if checkpoint_version != MATCHING_VERSION:
+                logger.warning("=" * 60)
+                logger.warning(f"checkpoint version mismatch!")
+                logger.warning(f"checkpoint version: {checkpoint_version}")
+                logger.warning(f"current version: {MATCHING_VERSION}")
+                logger.warning("starting fresh geocoding with new algorithm")
+                logger.warning("=" * 60)
+                return None
     
-    # Return the most populous city (with distance as tiebreaker)
-    # NO "one city per station" restriction - multiple stations can match same city
-    city_row = df_nearby.iloc[0]
-    return {
-        'city': city_row['city'],
-        'country': city_row['country'],
-        'state': city_row['admin_name'],
-        'suburb': '',  # No suburb info in worldcities
-        'city_ascii': city_row.get('city_ascii', ''),
-        'iso2': city_row.get('iso2', ''),
-        'iso3': city_row.get('iso3', ''),
-        'capital': city_row.get('capital', ''),
-        'population': city_row.get('population', None),
-        'worldcities_id': city_row.get('id', ''),
-        'data_source': 'worldcities'
-    }
+    if part_paths:
+        # part files are numbered in the order they were written, so name order is row order
+        df_existing = pd.concat([pd.read_parquet(path) for path in part_paths], ignore_index=True)
+    else:
+        df_existing = pd.read_csv(checkpoint_path)
+        if not legacy_csv_checkpoint:
+            # one-time migration: the csv becomes the first parquet part, so later
+            # checkpoints append to it and resumes no longer parse the csv
+            logger.info(f"migrating csv checkpoint to parquet part files in {parts_dir}")
+            _write_checkpoint_part(df_existing)
+    
+    if unique_locs is not None:
+        # parts are appended across runs, so they can hold locations of an earlier input
+        # that are not in this one - drop those so they are never batched
+        is_current = np.isin(coordinate_keys(df_existing['lat'], df_existing['long']),
+                             coordinate_keys(unique_locs['lat'], unique_locs['long']))
+        if not is_current.all():
+            logger.info(f"ignoring {(~is_current).sum():,} checkpoint locations not in the current input")
+            df_existing = df_existing[is_current].reset_index(drop=True)
+    
+    logger.info(f"loaded {len(df_existing):,} previously geocoded locations")
+    return df_existing
 
 
-def load_geocoding_progress() -> Optional[pd.DataFrame]:
-    """load previous geocoding progress if it exists."""
-    checkpoint_path = get_checkpoint_path()
-    progress_path = get_progress_path()
+def clear_geocoding_checkpoint():
+    """remove the parquet checkpoint part files (before geocoding starts from scratch)."""
+    parts_dir = get_checkpoint_parts_dir()
+    if parts_dir.exists():
+        for path in parts_dir.glob('part_*.parquet'):
+            path.unlink()
+
+
+def open_nominatim_cache() -> sqlite3.Connection:
+    """open (or create) the sqlite cache of raw nominatim responses, keyed on rounded lat/long."""
+    cache_path = get_nominatim_cache_path()
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(cache_path)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS nominatim_responses ("
+        "lat_key INTEGER NOT NULL, long_key INTEGER NOT NULL, raw TEXT NOT NULL, "
+        "PRIMARY KEY (lat_key, long_key))"
+    )
+    return conn
+
+
+def nominatim_cache_key(lat: float, long: float) -> Tuple[int, int]:
+    """integer (lat, long) cache key at NOMINATIM_CACHE_DECIMALS decimals."""
+    scale = 10 ** NOMINATIM_CACHE_DECIMALS
+    return int(round(lat * scale)), int(round(long * scale))
+
+
+def _write_checkpoint_part(df: pd.DataFrame):
+    """
+    write rows of the geocoding checkpoint as a new zstd parquet part file.
     
-    if checkpoint_path.exists():
-        logger.info(f"found existing geocoding checkpoint: {checkpoint_path}")
-        df_existing = pd.read_csv(checkpoint_path)
-        
-        # check version compatibility
-        if progress_path.exists():
-            with open(progress_path, 'r') as f:
-                progress_info = json.load(f)
-                checkpoint_version = progress_info.get('matching_version', 'v1_nominatim')
-                
-                if checkpoint_version != MATCHING_VERSION:
-                    logger.warning("=" * 60)
-                    logger.warning(f"checkpoint version mismatch!")
-                    logger.warning(f"checkpoint version: {checkpoint_version}")
-                    logger.warning(f"current version: {MATCHING_VERSION}")
-                    logger.warning("starting fresh geocoding with new algorithm")
-                    logger.warning("=" * 60)
-                    return None
-        
-        logger.info(f"loaded {len(df_existing):,} previously geocoded locations")
-        return df_existing
-    return None
+    parts are numbered one past the highest existing part, never by row counts - those
+    depend on the current input, and a reused name would overwrite earlier rows.
+    """
+    parts_dir = get_checkpoint_parts_dir()
+    parts_dir.mkdir(parents=True, exist_ok=True)
+    part_numbers = [int(path.stem[len('part_'):]) for path in parts_dir.glob('part_*.parquet')
+                    if path.stem[len('part_'):].isdigit()]
+    part_number = max(part_numbers, default=-1) + 1
+    df.to_parquet(parts_dir / f"part_{part_number:07d}.parquet", compression='zstd', index=False)
 
 
-def save_geocoding_checkpoint(df: pd.DataFrame, progress_info: dict):
-    """Save geocoding progress to allow resumption."""
-    checkpoint_path = get_checkpoint_path()
+def save_geocoding_checkpoint(df_new: pd.DataFrame, progress_info: dict,
+                              df_all: Optional[pd.DataFrame] = None):
+    """
+    Save geocoding progress to allow resumption.
+    
+    Only the rows geocoded since the last checkpoint are written, as a new parquet part
+    file, so total checkpoint writes stay linear in the number of locations. If df_all
+    is given (legacy csv checkpoint), the whole frame is rewritten to the csv instead.
+    
+    Args:
+        df_new: rows geocoded since the previous checkpoint
+        progress_info: progress metadata ('completed' = rows geocoded including df_new)
+        df_all: all rows geocoded so far, for the legacy csv checkpoint
+    """
     progress_path = get_progress_path()
     
     logger.info(f"Saving checkpoint... ({progress_info['completed']}/{progress_info['total']} locations)")
-    df.to_csv(checkpoint_path, index=False)
+    if df_all is not None:
+        write_csv(df_all, get_checkpoint_path())
+    else:
+        _write_checkpoint_part(df_new)
     
     # Save progress metadata
     with open(progress_path, 'w') as f:
@@ -396,7 +537,9 @@ def reverse_geocode_locations(unique_locs: pd.DataFrame,
                               geocoding_delay: float = DEFAULT_GEOCODING_DELAY,
                               min_population: int = MIN_POPULATION,
                               primary_radius_km: float = SEARCH_RADIUS_KM_PRIMARY,
-                              fallback_radius_km: float = SEARCH_RADIUS_KM_FALLBACK) -> pd.DataFrame:
+                              fallback_radius_km: float = SEARCH_RADIUS_KM_FALLBACK,
+                              legacy_csv_checkpoint: bool = False,
+                              nominatim_url: Optional[str] = None) -> pd.DataFrame:
     """
     match weather stations to major cities using worldcities.csv, with nominatim fallback.
     
@@ -406,6 +549,9 @@ def reverse_geocode_locations(unique_locs: pd.DataFrame,
         min_population: minimum population for major cities
         primary_radius_km: primary search radius
         fallback_radius_km: fallback search radius
+        legacy_csv_checkpoint: checkpoint to one csv (rewritten every batch) instead of parquet parts
+        nominatim_url: base url of a self-hosted nominatim (e.g. http://localhost:8080); requests
+            to it are not rate limited, so geocoding_delay is ignored
     
     returns:
         dataframe with geocoded location information
@@ -415,11 +561,19 @@ def reverse_geocode_locations(unique_locs: pd.DataFrame,
     logger.info("=" * 80)
     logger.info(f"configuration: min_population={min_population:,}, primary_radius={primary_radius_km}km, fallback_radius={fallback_radius_km}km")
     
-    # store original coordinates before any rounding
-    unique_locs_original = unique_locs.copy()
+    # geocode every coordinate once: drop rows that share a coordinate key (4 decimals,
+    # the precision the weather rows are joined back on - coarser rounding would leave
+    # stations unmatched downstream)
+    location_keys = coordinate_keys(unique_locs['lat'], unique_locs['long'])
+    _, first_idx = np.unique(location_keys, return_index=True)
+    if len(first_idx) < len(unique_locs):
+        first_idx.sort()
+        logger.info(f"dropping {len(unique_locs) - len(first_idx):,} duplicate coordinates "
+                    f"({len(unique_locs):,} -> {len(first_idx):,} locations)")
+        unique_locs = unique_locs.iloc[first_idx].reset_index(drop=True)
     
     # check for existing progress
-    existing_geocoded = load_geocoding_progress()
+    existing_geocoded = load_geocoding_progress(legacy_csv_checkpoint)
     
     if existing_geocoded is not None:
         # DATA PROTECTION: Validate checkpoint integrity
@@ -437,14 +591,15 @@ def reverse_geocode_locations(unique_locs: pd.DataFrame,
             logger.error("Checkpoint appears corrupted. Starting fresh geocoding.")
             existing_geocoded = None
         else:
-            # Round coordinates in existing data to ensure match (4 decimals = ~11m precision)
-            existing_geocoded['lat'] = existing_geocoded['lat'].round(4)
-            existing_geocoded['long'] = existing_geocoded['long'].round(4)
+            # Match on packed int64 keys of the coordinates rounded to 4 decimals (~11m
+            # precision) instead of python sets / a merge on float pairs
+            checkpoint_keys = coordinate_keys(existing_geocoded['lat'], existing_geocoded['long'])
+            current_keys = coordinate_keys(unique_locs['lat'], unique_locs['long'])
             
             # DATA PROTECTION: Check for coordinate overlap
-            checkpoint_coords = set(zip(existing_geocoded['lat'], existing_geocoded['long']))
-            current_coords = set(zip(unique_locs['lat'], unique_locs['long']))
-            overlap = checkpoint_coords & current_coords
+            checkpoint_coords = np.unique(checkpoint_keys)
+            current_coords = np.unique(current_keys)
+            overlap = np.intersect1d(checkpoint_coords, current_coords, assume_unique=True)
             
             logger.info(f"Checkpoint has {len(checkpoint_coords)} locations")
             logger.info(f"Current data has {len(current_coords)} locations")
@@ -457,23 +612,26 @@ def reverse_geocode_locations(unique_locs: pd.DataFrame,
                 logger.warning("Checkpoint will still be used, but verify results carefully.")
                 logger.warning("=" * 60)
             
-            # Merge existing results
-            unique_locs = unique_locs.merge(
-                existing_geocoded,
-                on=['lat', 'long'],
-                how='left',
-                suffixes=('', '_existing')
-            )
-            
-            # DATA PROTECTION: Verify merge didn't lose data
-            if len(unique_locs) != len(unique_locs_original):
-                logger.error(f"CRITICAL: Merge changed row count! Before: {len(unique_locs_original)}, After: {len(unique_locs)}")
+            # Merge existing results (current lat/long are kept, the key is dropped after).
+            # DATA PROTECTION: unique_locs has one row per key, so validate='many_to_one'
+            # guarantees the row count is kept - it fails (before building the merged frame)
+            # if the checkpoint holds the same coordinate twice
+            try:
+                unique_locs = unique_locs.assign(coord_key=current_keys).merge(
+                    existing_geocoded.drop(columns=['lat', 'long']).assign(coord_key=checkpoint_keys),
+                    on='coord_key',
+                    how='left',
+                    suffixes=('', '_existing'),
+                    validate='many_to_one'
+                ).drop(columns=['coord_key'])
+            except pd.errors.MergeError as e:
+                logger.error(f"CRITICAL: Checkpoint has duplicate coordinates, merge would change row count ({e})")
                 logger.error("This indicates a data integrity issue. Aborting to prevent data loss.")
-                raise ValueError("Merge operation changed row count - potential data loss detected")
+                raise ValueError("Merge operation changed row count - potential data loss detected") from e
         
             # Identify locations that still need geocoding
-            needs_geocoding = unique_locs[unique_locs['city'].isna()].copy()
-            already_geocoded = unique_locs[unique_locs['city'].notna()].copy()
+            needs_geocoding = unique_locs[unique_locs['city'].isna()]
+            already_geocoded = unique_locs[unique_locs['city'].notna()]
             
             logger.info("=" * 60)
             logger.info("RESUMING FROM CHECKPOINT")
@@ -491,67 +649,76 @@ def reverse_geocode_locations(unique_locs: pd.DataFrame,
                 logger.info("All locations already geocoded!")
                 return unique_locs
     else:
-        needs_geocoding = unique_locs.copy()
+        needs_geocoding = unique_locs
         already_geocoded = pd.DataFrame()
+        # don't let parts of an old (e.g. other version) checkpoint mix with the new ones
+        clear_geocoding_checkpoint()
     
     # load worldcities data - get both major cities and all cities
     logger.info("\\nloading worldcities data...")
     df_major_cities, df_all_cities = load_worldcities(min_population=min_population)
+    # city trees are built once and shared by every lookup below
+    major_city_tree = build_city_tree(df_major_cities)
+    all_city_tree = build_city_tree(df_all_cities)
     
     # initialize nominatim geocoder for fallback
-    geolocator = Nominatim(user_agent="vaycay_weather_geocoder", timeout=10)
-    reverse = RateLimiter(geolocator.reverse, min_delay_seconds=geocoding_delay)
-    
-    def safe_reverse(row):
-        """safely reverse geocode a location with error handling and retries."""
+    if nominatim_url:
+        # self-hosted instance: no public 1 request/second usage policy, so no rate limiter
+        url = urlparse(nominatim_url)
+        logger.info(f"using self-hosted nominatim at {nominatim_url} (no rate limit)")
+        geolocator = Nominatim(user_agent="vaycay_weather_geocoder", timeout=15,
+                               domain=url.netloc + url.path.rstrip('/'), scheme=url.scheme or 'http')
+        reverse = geolocator.reverse
+        geocoding_delay = 0.0
+    else:
+        geolocator = Nominatim(user_agent="vaycay_weather_geocoder", timeout=10)
+        # errors are raised (not swallowed and turned into None) so safe_reverse's own
+        # retry loop handles them and nothing but real answers ends up in the cache
+        reverse = RateLimiter(geolocator.reverse, min_delay_seconds=geocoding_delay,
+                              max_retries=0, swallow_exceptions=False)
+    
+    def safe_reverse(lat, long):
+        """safely reverse geocode a location with error handling and retries (cached)."""
+        cache_key = nominatim_cache_key(lat, long)
+        cached = nominatim_cache.execute(
+            "SELECT raw FROM nominatim_responses WHERE lat_key = ? AND long_key = ?", cache_key
+        ).fetchone()
+        if cached is not None:
+            return json.loads(cached[0])
+        
         max_retries = 3
         for attempt in range(max_retries):
             try:
-                location = reverse((row['lat'], row['long']), language='en')
-                return location.raw if location else {}
+                location = reverse((lat, long), language='en')
             except Exception as e:
                 if attempt < max_retries - 1:
-                    logger.debug(f"retry {attempt + 1}/{max_retries} for ({row['lat']}, {row['long']}): {e}")
-                    time.sleep(2)  # wait before retry
-                else:
-                    logger.warning(f"failed after {max_retries} attempts ({row['lat']}, {row['long']}): {e}")
-                    return {}
+                    logger.debug(f"retry {attempt + 1}/{max_retries} for ({lat}, {long}): {e}")
+                    # exponential backoff with jitter (2-3s, then 4-5s) so throttled
+                    # requests (http 429) back off instead of retrying at a fixed pace
+                    time.sleep(2 ** (attempt + 1) + random.random())
+                    continue
+                logger.warning(f"failed after {max_retries} attempts ({lat}, {long}): {e}")
+                return {}
+            raw = location.raw if location else {}
+            # only real answers are cached (not the {} returned after failed retries)
+            with nominatim_cache:
+                nominatim_cache.execute(
+                    "INSERT OR REPLACE INTO nominatim_responses VALUES (?, ?, ?)",
+                    (*cache_key, json.dumps(raw))
+                )
+            return raw
         return {}
     
-    def extract_city(location):
-        """extract city name from geocoding result."""
-        if location:
-            address = location.get('address', {})
-            return address.get('city', address.get('town', address.get('village', '')))
-        return ''
-    
-    def extract_state(location):
-        """extract state/region from geocoding result."""
-        if location:
-            address = location.get('address', {})
-            return address.get('state', address.get('county', ''))
-        return ''
-    
-    def extract_country(location):
-        """extract country from geocoding result."""
-        if location:
-            address = location.get('address', {})
-            return address.get('country', '')
-        return ''
-    
-    def extract_country_code(location):
-        """extract country code (iso2) from geocoding result."""
-        if location:
-            address = location.get('address', {})
-            return address.get('country_code', '').upper()
-        return ''
-    
-    def extract_suburb(location):
-        """extract suburb/municipality from geocoding result."""
-        if location:
-            address = location.get('address', {})
-            return address.get('suburb', address.get('municipality', ''))
-        return ''
+    def extract_address_fields(location):
+        """extract city, state, country, country code (iso2) and suburb from a geocoding result."""
+        address = location.get('address', {}) if location else {}
+        return {
+            'city': address.get('city', address.get('town', address.get('village', ''))),
+            'state': address.get('state', address.get('county', '')),
+            'country': address.get('country', ''),
+            'iso2': address.get('country_code', '').upper(),
+            'suburb': address.get('suburb', address.get('municipality', '')),
+        }
     
     # statistics tracking (NO MORE "assigned_cities" - multiple stations can match same city)
     stats = {
@@ -566,6 +733,8 @@ def reverse_geocode_locations(unique_locs: pd.DataFrame,
     total_to_geocode = len(needs_geocoding)
     total_locations = len(unique_locs)
     already_completed = len(already_geocoded)
+    geocoded_frames = [already_geocoded] if already_completed > 0 else []
+    completed_count = already_completed
     start_time = time.time()
 
     # use a reasonable batch size for geocoding checkpoints (100 locations)
@@ -574,149 +743,171 @@ def reverse_geocode_locations(unique_locs: pd.DataFrame,
     # calculate which batch we're starting from
     starting_batch = already_completed // geocoding_checkpoint_size + 1 if already_completed > 0 else 1
     
-    for i in range(0, total_to_geocode, geocoding_checkpoint_size):
-        batch_end = min(i + geocoding_checkpoint_size, total_to_geocode)
-        batch = needs_geocoding.iloc[i:batch_end].copy()
+    # step 1 for all remaining locations at once: match to major cities (population ≥ 100k).
+    # only reads the city arrays, so it runs up front (threaded) and the checkpoint
+    # batches below just pick up their slice
+    all_major_matches = match_stations_to_cities(
+        needs_geocoding['lat'].to_numpy(),
+        needs_geocoding['long'].to_numpy(),
+        df_major_cities,
+        major_city_tree,
+        primary_radius_km=primary_radius_km,
+        fallback_radius_km=fallback_radius_km
+    )
+    
+    # step 2 up front as well, for the locations without a major city: match to ALL
+    # cities (any population)
+    all_small_matches = np.full(total_to_geocode, -1, dtype=np.int64)
+    no_major_match = np.flatnonzero(all_major_matches < 0)
+    all_small_matches[no_major_match] = match_stations_to_cities(
+        needs_geocoding['lat'].to_numpy()[no_major_match],
+        needs_geocoding['long'].to_numpy()[no_major_match],
+        df_all_cities,
+        all_city_tree,
+        primary_radius_km=primary_radius_km,
+        fallback_radius_km=fallback_radius_km
+    )
+    
+    # raw nominatim responses persist across runs (and checkpoint resets), so no
+    # coordinate is ever sent to nominatim twice
+    nominatim_cache = open_nominatim_cache()
+    try:
+        for i in range(0, total_to_geocode, geocoding_checkpoint_size):
+            batch_end = min(i + geocoding_checkpoint_size, total_to_geocode)
+            batch = needs_geocoding.iloc[i:batch_end]
+            major_matches = all_major_matches[i:batch_end]
+            small_matches = all_small_matches[i:batch_end]
+        
+            # calculate actual batch number (accounting for already completed)
+            current_batch = starting_batch + (i // geocoding_checkpoint_size)
+            actual_location_start = already_completed + i + 1
+            actual_location_end = already_completed + batch_end
+        
+            logger.info(f"\\nprocessing batch {current_batch} (locations {actual_location_start}-{actual_location_end} of {total_locations})")
         
-        # calculate actual batch number (accounting for already completed)
-        current_batch = starting_batch + (i // geocoding_checkpoint_size)
-        actual_location_start = already_completed + i + 1
-        actual_location_end = already_completed + batch_end
+            # process the batch with cascading fallback - the worldcities stages are already
+            # resolved, so only the residual locations are handled one by one
+            lats = batch['lat'].to_numpy()
+            longs = batch['long'].to_numpy()
+            # results are assembled column by column (GEOCODED_COLUMNS -> array), filled by position
+            batch_columns = {col: np.empty(len(batch), dtype=object) for col in GEOCODED_COLUMNS}
+            batch_columns['population'] = np.full(len(batch), np.nan, dtype=np.float32)
         
-        logger.info(f"\\nprocessing batch {current_batch} (locations {actual_location_start}-{actual_location_end} of {total_locations})")
+            # step 1: major city match (computed above for all locations)
+            major_rows = np.flatnonzero(major_matches >= 0)
+            for col, values in _worldcities_columns(df_major_cities, major_matches[major_rows]).items():
+                batch_columns[col][major_rows] = values
+            stats['worldcities_matched'] += len(major_rows)
         
-        # process each location in the batch with cascading fallback
-        batch_results = []
-        for idx, row in batch.iterrows():
-            match_result = None
+            # step 2: if no major city match, try ALL cities (any population, computed above)
+            small_rows = np.flatnonzero((major_matches < 0) & (small_matches >= 0))
+            small_columns = _worldcities_columns(df_all_cities, small_matches[small_rows],
+                                                 data_source='worldcities_small')  # mark as small city match
+            for col, values in small_columns.items():
+                batch_columns[col][small_rows] = values
+            stats['worldcities_small'] += len(small_rows)
+        
+            for pos in np.flatnonzero((major_matches < 0) & (small_matches < 0)):
+                lat, long = lats[pos], longs[pos]
+                match_result = None
             
-            # step 1: try matching to major cities (population ≥ 100k)
-            match_result = match_station_to_major_city(
-                row['lat'],
-                row['long'],
-                df_major_cities,
-                primary_radius_km=primary_radius_km,
-                fallback_radius_km=fallback_radius_km
-            )
+                # step 3: if still no match, try nominatim
+                location = safe_reverse(lat, long)
+                address_fields = extract_address_fields(location)
             
-            # step 2: if no major city match, try ALL cities (any population)
-            if not match_result:
-                match_result = match_station_to_major_city(
-                    row['lat'],
-                    row['long'],
-                    df_all_cities,
-                    primary_radius_km=primary_radius_km,
-                    fallback_radius_km=fallback_radius_km
-                )
-                if match_result:
-                    match_result['data_source'] = 'worldcities_small'  # mark as small city match
-
-            # step 3: if still no match, try nominatim
-            if not match_result:
-                location = safe_reverse(row)
-                city = extract_city(location)
-                
-                if city:
+                if address_fields['city']:
                     match_result = {
-                        'city': city,
-                        'country': extract_country(location),
-                        'state': extract_state(location),
-                        'suburb': extract_suburb(location),
+                        'city': address_fields['city'],
+                        'country': address_fields['country'],
+                        'state': address_fields['state'],
+                        'suburb': address_fields['suburb'],
                         'city_ascii': '',
-                        'iso2': extract_country_code(location),
+                        'iso2': address_fields['iso2'],
                         'iso3': '',
                         'capital': '',
                         'population': None,
                         'worldcities_id': '',
                         'data_source': 'nominatim'
                     }
-            
-            # step 4: if everything failed, use geographic region fallback
-            if not match_result:
-                match_result = get_geographic_region(row['lat'], row['long'])
-                stats['geographic_region'] += 1
-                logger.debug(f"Using geographic region for ({row['lat']}, {row['long']}): {match_result['city']}")
-            else:
-                # track statistics based on data source
-                if match_result['data_source'] == 'worldcities':
-                    stats['worldcities_matched'] += 1
-                elif match_result['data_source'] == 'worldcities_small':
-                    stats['worldcities_small'] += 1
-                elif match_result['data_source'] == 'worldcities_distant':
-                    stats['worldcities_distant'] += 1
-                elif match_result['data_source'] == 'nominatim':
                     stats['nominatim_fallback'] += 1
             
-            # add to batch results
-            batch_results.append({
-                'lat': row['lat'],
-                'long': row['long'],
-                **match_result
-            })
+                # step 4: if everything failed, use geographic region fallback
+                if not match_result:
+                    match_result = get_geographic_region(lat, long)
+                    stats['geographic_region'] += 1
+                    logger.debug(f"Using geographic region for ({lat}, {long}): {match_result['city']}")
+            
+                for col in GEOCODED_COLUMNS:
+                    value = match_result[col]
+                    batch_columns[col][pos] = np.nan if value is None else value
         
-        # convert batch results to dataframe
-        batch_df = pd.DataFrame(batch_results)
+            # build the batch dataframe from the columns (object columns get their dtype inferred)
+            batch_df = pd.DataFrame({'lat': lats, 'long': longs, **batch_columns}).infer_objects()
         
-        # combine with already processed data
-        if len(already_geocoded) > 0:
-            combined = pd.concat([already_geocoded, batch_df], ignore_index=True)
-        else:
-            combined = batch_df
+            # collect batches and concatenate once at the end (concatenating every batch onto
+            # the accumulated frame copied all earlier rows again each time)
+            geocoded_frames.append(batch_df)
+            completed_count += len(batch_df)
         
-        # save checkpoint
-        progress_info = {
-            'completed': len(combined),
-            'total': total_locations,
-            'worldcities_matched': stats['worldcities_matched'],
-            'worldcities_small': stats['worldcities_small'],
-            'worldcities_distant': stats['worldcities_distant'],
-            'nominatim_fallback': stats['nominatim_fallback'],
-            'geographic_region': stats['geographic_region'],
-            'last_updated': datetime.now().isoformat(),
-            'current_batch': current_batch,
-            'matching_version': MATCHING_VERSION,
-            'estimated_time_remaining_minutes': (
-                (total_to_geocode - batch_end) * geocoding_delay / 60
-            ) if batch_end < total_to_geocode else 0
-        }
-        save_geocoding_checkpoint(combined, progress_info)
-        
-        # update already_geocoded for next iteration
-        already_geocoded = combined
+            # save checkpoint
+            progress_info = {
+                'completed': completed_count,
+                'total': total_locations,
+                'worldcities_matched': stats['worldcities_matched'],
+                'worldcities_small': stats['worldcities_small'],
+                'worldcities_distant': stats['worldcities_distant'],
+                'nominatim_fallback': stats['nominatim_fallback'],
+                'geographic_region': stats['geographic_region'],
+                'last_updated': datetime.now().isoformat(),
+                'current_batch': current_batch,
+                'matching_version': MATCHING_VERSION,
+                'estimated_time_remaining_minutes': (
+                    (total_to_geocode - batch_end) * geocoding_delay / 60
+                ) if batch_end < total_to_geocode else 0
+            }
+            if legacy_csv_checkpoint:
+                # the csv checkpoint is rewritten in full, so it still needs the combined frame
+                save_geocoding_checkpoint(batch_df, progress_info,
+                                          df_all=pd.concat(geocoded_frames, ignore_index=True))
+            else:
+                save_geocoding_checkpoint(batch_df, progress_info)
         
-        # progress update
-        elapsed = time.time() - start_time
-        locations_processed_this_session = batch_end
-        rate = locations_processed_this_session / elapsed if elapsed > 0 else 0
-        remaining = total_to_geocode - batch_end
-        eta_seconds = remaining / rate if rate > 0 else 0
+            # progress update
+            elapsed = time.time() - start_time
+            locations_processed_this_session = batch_end
+            rate = locations_processed_this_session / elapsed if elapsed > 0 else 0
+            remaining = total_to_geocode - batch_end
+            eta_seconds = remaining / rate if rate > 0 else 0
         
-        overall_progress = len(combined)
-        logger.info(f"overall progress: {overall_progress}/{total_locations} ({100*overall_progress/total_locations:.1f}%)")
-        logger.info(f"this session: {locations_processed_this_session}/{total_to_geocode} locations")
-        logger.info(f"worldcities: {stats['worldcities_matched']}, small cities: {stats['worldcities_small']}, distant: {stats['worldcities_distant']}, nominatim: {stats['nominatim_fallback']}, geographic: {stats['geographic_region']}")
-        logger.info(f"rate: {rate:.2f} locations/sec")
-        logger.info(f"eta for remaining: {eta_seconds/60:.1f} minutes")
+            overall_progress = completed_count
+            logger.info(f"overall progress: {overall_progress}/{total_locations} ({100*overall_progress/total_locations:.1f}%)")
+            logger.info(f"this session: {locations_processed_this_session}/{total_to_geocode} locations")
+            logger.info(f"worldcities: {stats['worldcities_matched']}, small cities: {stats['worldcities_small']}, distant: {stats['worldcities_distant']}, nominatim: {stats['nominatim_fallback']}, geographic: {stats['geographic_region']}")
+            logger.info(f"rate: {rate:.2f} locations/sec")
+            logger.info(f"eta for remaining: {eta_seconds/60:.1f} minutes")
+    finally:
+        # also on errors and ctrl-c (e.g. during the long nominatim loop), so the connection never leaks
+        nominatim_cache.close()
     
     # Final save
+    final_result = pd.concat(geocoded_frames, ignore_index=True) if geocoded_frames else already_geocoded
     logger.info("\\nGeocoding complete! Saving final results...")
-    logger.info(f"✓ All {len(already_geocoded):,} locations successfully geocoded (100% coverage)")
+    logger.info(f"✓ All {len(final_result):,} locations successfully geocoded (100% coverage)")
     logger.info(f"  - Worldcities major: {stats['worldcities_matched']:,}")
     logger.info(f"  - Worldcities small: {stats['worldcities_small']:,}")
     logger.info(f"  - Worldcities distant: {stats['worldcities_distant']:,}")
     logger.info(f"  - Nominatim: {stats['nominatim_fallback']:,}")
     logger.info(f"  - Geographic regions: {stats['geographic_region']:,}")
-    final_result = already_geocoded
 
     # Save detailed version with location objects
     simplified_path = get_simplified_data_path()
-    final_result.to_csv(simplified_path, index=False)
+    write_csv(final_result, simplified_path)
     logger.info(f"Saved simplified data to: {simplified_path}")
     
     # Save version without location objects for cleaner output
     output_cols = ['lat', 'long', 'city', 'state', 'country', 'suburb']
     full_path = get_full_data_path()
-    final_result[output_cols].to_csv(full_path, index=False)
+    write_csv(final_result[output_cols], full_path)
     logger.info(f"Saved full data to: {full_path}")
     
     return final_result
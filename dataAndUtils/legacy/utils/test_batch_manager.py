@@ -0,0 +1,40 @@
+"""
+Tests for the CSV writer of batch_manager.
+
+Run with pytest from outside the repo (config writes weather_processing.log to the cwd):
+    python -m pytest /path/to/dataAndUtils/legacy/utils/test_batch_manager.py
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from batch_manager import write_csv  # noqa: E402
+
+
+def test_write_csv_matches_to_csv_without_quoting(tmp_path):
+    df = pd.DataFrame({
+        'city': ['City0', 'City1'],
+        'suburb': ['', None],
+        'lat': [16.475076923076923, 51.45],
+        'TMAX': np.array([16.72, np.nan], dtype=np.float32),
+    })
+
+    write_csv(df, tmp_path / 'out.csv')
+
+    assert (tmp_path / 'out.csv').read_text() == df.to_csv(index=False)
+
+
+def test_write_csv_quotes_values_with_separators(tmp_path):
+    df = pd.DataFrame({'city': ['Washington, D.C.', 'Paris'], 'population': [5e6, 2e6]})
+
+    write_csv(df, tmp_path / 'out.csv')
+
+    assert (tmp_path / 'out.csv').read_text().splitlines() == [
+        'city,population', '"Washington, D.C.",5000000', '"Paris",2000000'
+    ]
+    pd.testing.assert_frame_equal(pd.read_csv(tmp_path / 'out.csv'), df, check_dtype=False)
@@ -0,0 +1,111 @@
+"""
+Tests for the pivot and location lookup of data_processor.
+
+Run with pytest from outside the repo (config writes weather_processing.log to the cwd):
+    python -m pytest /path/to/dataAndUtils/legacy/utils/test_data_processor.py
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+import config  # noqa: E402,F401  (enables copy-on-write on pandas 2)
+from data_processor import (  # noqa: E402
+    get_batch_ranges,
+    locate_coordinates,
+    pivot_and_clean_data,
+    sort_locations_for_batching,
+)
+
+
+def enriched_batch(values: dict) -> pd.DataFrame:
+    """one station in one city, one row per (date, data_type), float32 values like the loaders."""
+    rows = [
+        {'date': pd.Timestamp('2020-01-01') + pd.Timedelta(days=day), 'data_type': data_type, 'value': value}
+        for data_type, day_values in values.items()
+        for day, value in enumerate(day_values)
+    ]
+    df = pd.DataFrame(rows)
+    df['value'] = df['value'].astype(np.float32)
+    df['data_type'] = df['data_type'].astype('category')
+    return df.assign(
+        id='ST1', name='STATION', lat=np.float32(51.45), long=np.float32(-0.1),
+        city='London', country='United Kingdom', state='England', suburb='',
+        population=9e6, data_source='worldcities'
+    )
+
+
+def test_pivot_scales_tenths_under_copy_on_write():
+    assert int(pd.__version__.split('.')[0]) >= 3 or pd.options.mode.copy_on_write
+
+    df_pivot = pivot_and_clean_data(enriched_batch({
+        'TMAX': [105.0, 120.0],
+        'TMIN': [-12.0, 31.0],
+        'TAVG': [40.0, 77.0],
+        'PRCP': [3.0, 0.0],
+    }))
+
+    assert df_pivot['date'].tolist() == ['2020-01-01', '2020-01-02']
+    np.testing.assert_allclose(df_pivot['TMAX'], [10.5, 12.0])
+    np.testing.assert_allclose(df_pivot['TMIN'], [-1.2, 3.1], rtol=1e-6)
+    np.testing.assert_allclose(df_pivot['TAVG'], [4.0, 7.7], rtol=1e-6)
+    np.testing.assert_allclose(df_pivot['PRCP'], [0.3, 0.0], rtol=1e-6)
+
+
+def test_pivot_imputes_missing_tavg():
+    df_pivot = pivot_and_clean_data(enriched_batch({
+        'TMAX': [200.0, 200.0],
+        'TMIN': [100.0, 100.0],
+        'TAVG': [150.0, np.nan],
+        'PRCP': [0.0, 0.0],
+    }))
+
+    # TAVG = TMIN + 0.44 * (TMAX - TMIN), in degrees
+    np.testing.assert_allclose(df_pivot['TAVG'], [15.0, 14.4], rtol=1e-6)
+
+
+def test_sort_and_batch_ranges_keep_cities_together():
+    # float32 coordinates, as loaded - to_numpy() of these is a read-only view
+    locations = pd.DataFrame({
+        'lat': np.array([48.85, 51.5, 48.86, 51.51, 40.7], dtype=np.float32),
+        'long': np.array([2.35, -0.1, 2.34, -0.12, -74.0], dtype=np.float32),
+        'city': pd.Categorical(['Paris', 'London', 'Paris', 'London', 'New York']),
+        'country': pd.Categorical(['France', 'UK', 'France', 'UK', 'USA']),
+    })
+
+    sorted_locations = sort_locations_for_batching(locations)
+    cities = sorted_locations['city'].tolist()
+    assert sorted(cities) == sorted(locations['city'].tolist())
+    # same-city stations are contiguous
+    assert len([c for i, c in enumerate(cities) if i == 0 or cities[i - 1] != c]) == 3
+
+    ranges = get_batch_ranges(sorted_locations, batch_size=2)
+    assert ranges[0][0] == 0 and ranges[-1][1] == len(locations)
+    for start, end in ranges:
+        batch_cities = set(cities[start:end])
+        assert all(cities.count(city) == cities[start:end].count(city) for city in batch_cities)
+
+
+def test_locate_coordinates_skips_invalid_coordinates():
+    locations = pd.DataFrame({'lat': [51.5, 48.85], 'long': [-0.1, 2.35]})
+    weather = pd.DataFrame({
+        'lat': [51.5, np.nan, 48.85, 51.5, 95.0],
+        'long': [-0.1, 2.35, np.nan, np.inf, 2.35],
+    })
+
+    assert locate_coordinates(weather, locations).tolist() == [0, -1, -1, -1, -1]
+
+
+def test_locate_coordinates_matches_within_11m():
+    locations = pd.DataFrame({'lat': [51.5, 48.85], 'long': [-0.1, 2.35]})
+    # 0.00005 degrees of latitude is ~5.6m, 0.0002 is ~22m
+    weather = pd.DataFrame({
+        'lat': np.array([51.50005, 48.8502, 48.85], dtype=np.float32),
+        'long': np.array([-0.1, 2.35, 2.35], dtype=np.float32),
+    })
+
+    assert locate_coordinates(weather, locations).tolist() == [0, -1, 1]
@@ -0,0 +1,148 @@
+"""
+Tests for the nominatim fallback of reverse_geocode_locations.
+
+Nominatim is never contacted: geopy's Nominatim.reverse is replaced by a fake, and
+worldcities/city_data point at a temporary directory.
+
+Run with pytest from outside the repo (config writes weather_processing.log to the cwd):
+    python -m pytest /path/to/dataAndUtils/legacy/utils/test_geocoding.py
+"""
+
+import sqlite3
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+from geopy.exc import GeocoderServiceError
+from geopy.geocoders import Nominatim
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+import config  # noqa: E402
+import geocoding  # noqa: E402
+
+
+@pytest.fixture
+def geocoding_env(tmp_path, monkeypatch):
+    """one major city far away from the test station, city data in tmp_path."""
+    worldcities_path = tmp_path / 'worldcities.csv'
+    pd.DataFrame([{
+        'city': 'A', 'city_ascii': 'A', 'lat': 10.0, 'lng': 10.0, 'country': 'C', 'iso2': 'CC',
+        'iso3': 'CCC', 'admin_name': 'S', 'capital': '', 'population': 5e6, 'id': '1'
+    }]).to_csv(worldcities_path, index=False)
+    for module in (config, geocoding):
+        monkeypatch.setattr(module, 'WORLDCITIES_PATH', worldcities_path, raising=False)
+        monkeypatch.setattr(module, 'CITY_DATA_DIR', tmp_path / 'city_data', raising=False)
+    (tmp_path / 'city_data').mkdir()
+
+    sleeps = []
+    monkeypatch.setattr(geocoding.time, 'sleep', sleeps.append)
+    return sleeps
+
+
+def failing_reverse(calls):
+    """a Nominatim.reverse that records its calls and always fails (e.g. http 429)."""
+    def reverse(self, query, **kwargs):
+        calls.append(query)
+        raise GeocoderServiceError("429 too many requests")
+    return reverse
+
+
+def cached_rows():
+    with sqlite3.connect(config.get_nominatim_cache_path()) as conn:
+        return conn.execute("SELECT * FROM nominatim_responses").fetchall()
+
+
+def test_failed_public_lookup_is_not_cached(geocoding_env, monkeypatch):
+    calls = []
+    monkeypatch.setattr(Nominatim, 'reverse', failing_reverse(calls))
+
+    locs = pd.DataFrame({'lat': [-40.0], 'long': [100.0]})
+    result = geocoding.reverse_geocode_locations(locs, geocoding_delay=0)
+
+    assert len(result) == 1
+    assert calls
+    assert cached_rows() == []
+
+
+def test_failed_public_lookup_backs_off_and_retries(geocoding_env, monkeypatch):
+    calls = []
+    monkeypatch.setattr(Nominatim, 'reverse', failing_reverse(calls))
+
+    locs = pd.DataFrame({'lat': [-40.0], 'long': [100.0]})
+    geocoding.reverse_geocode_locations(locs, geocoding_delay=0)
+
+    # 3 attempts, with exponential backoff + jitter between them (2-3s, then 4-5s)
+    assert len(calls) == 3
+    backoffs = [s for s in geocoding_env if s >= 2]
+    assert len(backoffs) == 2
+    assert 2 <= backoffs[0] < 3
+    assert 4 <= backoffs[1] < 5
+
+
+def test_checkpoint_parts_never_overwrite_each_other(geocoding_env):
+    migrated = pd.DataFrame({'lat': [1.0], 'long': [1.0], 'city': ['Old'], 'country': ['C']})
+    geocoding._write_checkpoint_part(migrated)
+
+    # a run over different input starts counting completed rows from 0 again
+    new_rows = pd.DataFrame({'lat': [2.0], 'long': [2.0], 'city': ['New'], 'country': ['C']})
+    geocoding.save_geocoding_checkpoint(
+        new_rows, {'completed': 1, 'total': 1, 'matching_version': config.MATCHING_VERSION}
+    )
+
+    loaded = geocoding.load_geocoding_progress()
+    assert loaded['city'].tolist() == ['Old', 'New']
+
+
+def test_match_stations_to_cities_prefers_the_most_populous_city():
+    cities = pd.DataFrame({
+        'city': ['Borough', 'Metropolis', 'Far Town'],
+        'lat': np.array([51.50, 51.55, 10.0], dtype=np.float32),
+        'long': np.array([-0.10, -0.20, 10.0], dtype=np.float32),
+        'population': np.array([2e5, 9e6, 1e6], dtype=np.float32),
+    })
+    tree = geocoding.build_city_tree(cities)
+    stations = pd.DataFrame({'lat': np.array([51.501, -40.0], dtype=np.float32),
+                             'long': np.array([-0.101, 100.0], dtype=np.float32)})
+
+    matches = geocoding.match_stations_to_cities(
+        stations['lat'].to_numpy(), stations['long'].to_numpy(), cities, tree, n_jobs=1
+    )
+
+    assert matches.tolist() == [1, -1]
+
+
+def test_load_geocoding_progress_keeps_only_current_locations(geocoding_env):
+    progress = {'completed': 1, 'total': 1, 'matching_version': config.MATCHING_VERSION}
+    # an earlier run over other input, then a run over the current one
+    geocoding.save_geocoding_checkpoint(
+        pd.DataFrame({'lat': [1.0], 'long': [1.0], 'city': ['Stale'], 'country': ['C']}), progress
+    )
+    geocoding.save_geocoding_checkpoint(
+        pd.DataFrame({'lat': [2.0], 'long': [2.0], 'city': ['Current'], 'country': ['C']}), progress
+    )
+
+    unique_locs = pd.DataFrame({'lat': [2.0, 3.0], 'long': [2.0, 3.0]})
+    loaded = geocoding.load_geocoding_progress(unique_locs=unique_locs)
+
+    assert loaded['city'].tolist() == ['Current']
+    assert geocoding.load_geocoding_progress()['city'].tolist() == ['Stale', 'Current']
+
+
+def test_nominatim_cache_is_closed_when_geocoding_is_interrupted(geocoding_env, monkeypatch):
+    def interrupted_reverse(self, query, **kwargs):
+        raise KeyboardInterrupt
+    monkeypatch.setattr(Nominatim, 'reverse', interrupted_reverse)
+    connections = []
+    open_nominatim_cache = geocoding.open_nominatim_cache
+    monkeypatch.setattr(geocoding, 'open_nominatim_cache',
+                        lambda: connections.append(open_nominatim_cache()) or connections[-1])
+
+    locs = pd.DataFrame({'lat': [-40.0], 'long': [100.0]})
+    with pytest.raises(KeyboardInterrupt):
+        geocoding.reverse_geocode_locations(locs, geocoding_delay=0)
+
+    with pytest.raises(sqlite3.ProgrammingError):
+        connections[0].execute("SELECT 1")